@@ -0,0 +1,81 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from users.views import CustomUserViewSet
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def async_view(view):
+    """
+    Асинхронная обёртка над DRF-представлением для режима ASGI.
+
+    В Django 3.2 нет асинхронного ORM, а синхронные представления под
+    ASGI выполняются в одном общем потоке процесса: запрос, ждущий БД,
+    останавливает все остальные. Чтение здесь выполняется в пуле потоков
+    (thread_sensitive=False, размер задаёт ASGI_THREADS), так что
+    запросы ждут БД параллельно. Запись по-прежнему идёт через
+    sync_to_async в общем потоке, как у обычных представлений.
+
+    Тело StreamingHttpResponse читается там же, в потоке: ASGIHandler
+    Django 3.2 перебирает его в цикле событий, и запросы к БД из
+    генератора падали бы с SynchronousOnlyOperation после заголовков.
+    """
+    def respond(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.streaming:
+            response.streaming_content = list(response.streaming_content)
+        return response
+
+    def read(request, *args, **kwargs):
+        try:
+            return respond(request, *args, **kwargs)
+        finally:
+            # Соединения потоков пула закрываются по CONN_MAX_AGE так же,
+            # как в конце обычного запроса.
+            close_old_connections()
+
+    read = sync_to_async(read, thread_sensitive=False)
+    write = sync_to_async(respond)
+
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+def action_view(viewset, name):
+    """
+    Представление для @action: параметры декоратора (permission_classes
+    и другие) передаются так же, как это делает роутер.
+    """
+    return viewset.as_view(
+        {'get': name}, detail=False, **getattr(viewset, name).kwargs
+    )
+
+
+recipe_list = async_view(
+    RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+)
+recipe_detail = async_view(RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}))
+download_shopping_cart = async_view(
+    action_view(RecipeViewSet, 'download_shopping_cart')
+)
+tag_list = async_view(TagViewSet.as_view({'get': 'list'}))
+tag_detail = async_view(TagViewSet.as_view({'get': 'retrieve'}))
+ingredient_list = async_view(IngredientViewSet.as_view({'get': 'list'}))
+ingredient_detail = async_view(
+    IngredientViewSet.as_view({'get': 'retrieve'})
+)
+subscriptions = async_view(action_view(CustomUserViewSet, 'subscriptions'))
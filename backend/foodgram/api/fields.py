@@ -0,0 +1,40 @@
+from django.core.files.storage import default_storage
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+from rest_framework.validators import ValidationError
+
+from foodgram.settings import MAX_IMAGE_SIZE
+
+
+class RecipeImageField(Base64ImageField):
+    """Изображение в base64 с ограничением размера до декодирования."""
+
+    def to_internal_value(self, base64_data):
+        if (isinstance(base64_data, str)
+                and len(base64_data) * 3 // 4 > MAX_IMAGE_SIZE):
+            raise ValidationError(
+                f'Размер изображения больше '
+                f'{MAX_IMAGE_SIZE // (1024 * 1024)} МБ.'
+            )
+        return super().to_internal_value(base64_data)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Ссылки на уменьшенные копии изображения.
+    Пока копии не готовы, возвращается пустой словарь.
+    """
+
+    def to_representation(self, variants):
+        if 'error' in variants:
+            return {}
+        request = self.context.get('request')
+        result = {}
+        for variant, formats in variants.items():
+            result[variant] = {}
+            for extension, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[variant][extension] = url
+        return result
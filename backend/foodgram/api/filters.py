@@ -1,25 +1,56 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filter
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe
-from users.models import User
+from recipes.indexes import tag_index
+from recipes.models import Cart, Favorite, Recipe, TagRecipe
+from recipes.search import search
+
+
+def tag_choices():
+    return tag_index.choices()
 
 
 class RecipeFilter(filter.FilterSet):
+    """
+    Фильтры рецептов через EXISTS: без JOIN рецепты не дублируются,
+    и DISTINCT не нужен. Допустимые slug тегов берутся из tag_index,
+    а не запросом SELECT DISTINCT на каждый запрос.
+    """
     is_favorited = filter.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filter.BooleanFilter(
         method='filter_is_in_shopping_cart')
-    author = filter.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filter.AllValuesMultipleFilter(field_name='tags__slug')
+    author = filter.NumberFilter(field_name='author')
+    tags = filter.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_tags'
+    )
+    search = filter.CharFilter(method='filter_search')
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск; результаты упорядочены по рангу."""
+        if not value.strip():
+            return queryset
+        return search(queryset, value).order_by(
+            '-search_rank', '-pub_date', '-id'
+        )
+
+    def filter_tags(self, queryset, name, value):
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag__in=tag_index.ids(value)
+        )))
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(carts__user=self.request.user)
+            return queryset.filter(Exists(Cart.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     class Meta:
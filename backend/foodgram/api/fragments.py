@@ -0,0 +1,114 @@
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+
+from foodgram.db.routers import use_primary
+from foodgram.settings import RECIPE_FRAGMENT_TIMEOUT
+from recipes.indexes import (
+    INGREDIENTS_VERSION_KEY,
+    TAGS_VERSION_KEY,
+    get_version
+)
+from recipes.models import IngredientRecipe, Recipe
+
+HITS_KEY = 'recipes:fragments:hits'
+MISSES_KEY = 'recipes:fragments:misses'
+CONTENT_LOOKUPS = ('tags', 'ingredientrecipes')
+
+
+def increment(key, delta):
+    """Счётчик в кэше; создаётся при первом обращении."""
+    if not delta:
+        return
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def content_prefetches():
+    """Связанные данные, из которых строится фрагмент рецепта."""
+    return (
+        'tags',
+        Prefetch(
+            'ingredientrecipes',
+            queryset=IngredientRecipe.objects.select_related('ingredient')
+        ),
+    )
+
+
+def has_content(recipe):
+    prefetched = getattr(recipe, '_prefetched_objects_cache', {})
+    return all(lookup in prefetched for lookup in CONTENT_LOOKUPS)
+
+
+def refresh_content(recipe):
+    """
+    Повторная выборка тегов и ингредиентов рецепта после их изменения:
+    prefetch-кэш экземпляра к этому моменту устарел.
+    """
+    prefetched = getattr(recipe, '_prefetched_objects_cache', {})
+    for lookup in CONTENT_LOOKUPS:
+        prefetched.pop(lookup, None)
+    prefetch_related_objects([recipe], *content_prefetches())
+
+
+def fragment_key(recipe, prefix):
+    return f'{prefix}:{recipe.pk}:{recipe.updated.timestamp()}'
+
+
+def get_fragments(recipes, serializer_class, context):
+    """
+    Не зависящие от пользователя представления рецептов.
+    Берутся из кэша одним get_many; промахи сериализуются за
+    фиксированное число запросов и кладутся обратно set_many.
+    Ключ меняется при изменении рецепта, тегов или ингредиентов.
+    Рецепты с уже выбранными тегами и ингредиентами не перечитываются.
+    """
+    request = context.get('request')
+    prefix = ':'.join((
+        'recipes:fragment',
+        request.build_absolute_uri('/') if request else '',
+        get_version(TAGS_VERSION_KEY),
+        get_version(INGREDIENTS_VERSION_KEY),
+    ))
+    keys = {recipe.pk: fragment_key(recipe, prefix) for recipe in recipes}
+    cached = cache.get_many(keys.values())
+    fragments = {
+        pk: cached[key] for pk, key in keys.items() if key in cached
+    }
+    missing = keys.keys() - fragments.keys()
+    increment(HITS_KEY, len(fragments))
+    increment(MISSES_KEY, len(missing))
+    if missing:
+        loaded = [
+            recipe for recipe in recipes
+            if recipe.pk in missing and has_content(recipe)
+        ]
+        missing -= {recipe.pk for recipe in loaded}
+        if missing:
+            loaded += Recipe.objects.filter(pk__in=missing).prefetch_related(
+                *content_prefetches()
+            )
+        fresh = {}
+        with use_primary():
+            for recipe in loaded:
+                fragments[recipe.pk] = serializer_class(
+                    recipe, context=context
+                ).data
+                fresh[fragment_key(recipe, prefix)] = fragments[recipe.pk]
+        cache.set_many(fresh, RECIPE_FRAGMENT_TIMEOUT)
+    return fragments
+
+
+def get_stats():
+    """Попадания и промахи кэша фрагментов рецептов."""
+    counters = cache.get_many((HITS_KEY, MISSES_KEY))
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else None,
+    }
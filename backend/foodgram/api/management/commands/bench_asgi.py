@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+from recipes.models import Recipe
+
+MODES = ('wsgi', 'asgi')
+
+
+async def asgi_get(application, path, headers):
+    """
+    GET в ASGI-приложение так, как его шлёт сервер; True, если пришёл
+    ответ 200 и тело дочитано до конца.
+    """
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': headers + [(b'host', b'testserver')],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    }
+    messages = [{'type': 'http.request', 'body': b''}]
+    status = None
+    finished = False
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status, finished
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif not message.get('more_body', False):
+            finished = True
+
+    try:
+        await application(scope, receive, send)
+    except Exception:
+        return False
+    return status == 200 and finished
+
+
+class Command(BaseCommand):
+    help = '''Пропускная способность и p99 горячих маршрутов: WSGI и ASGI.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument(
+            '--db-latency',
+            type=float,
+            default=2.0,
+            help='Задержка каждого запроса к БД в мс: сеть до PostgreSQL.',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            help='Маршрут для замера; по умолчанию список, рецепт, теги '
+                 'и, с --token, выгрузка списка покупок.',
+        )
+        parser.add_argument('--token', help='Токен для авторизации.')
+        parser.add_argument('--mode', choices=MODES, help='Служебный.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                '--requests и --concurrency должны быть больше нуля.'
+            )
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run(options)))
+            return
+        # Каждый режим в своём процессе: маршруты выбираются по ASGI_MODE
+        # при импорте, а память процесса сравнивается честно.
+        for mode in MODES:
+            result = self.spawn(mode, options)
+            self.stdout.write(
+                f'{mode}: {result["rps"]:.0f} запросов/с, '
+                f'p50 {result["p50"]:.1f} мс, p99 {result["p99"]:.1f} мс, '
+                f'ошибок {result["errors"]}, '
+                f'память {result["rss_mb"]:.0f} МБ'
+            )
+
+    def spawn(self, mode, options):
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'),
+            'bench_asgi', '--mode', mode,
+            '--requests', str(options['requests']),
+            '--concurrency', str(options['concurrency']),
+            '--db-latency', str(options['db_latency']),
+        ]
+        for path in options['path'] or ():
+            command += ['--path', path]
+        if options['token']:
+            command += ['--token', options['token']]
+        env = dict(os.environ, ASGI_MODE='1' if mode == 'asgi' else '0')
+        process = subprocess.run(
+            command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr)
+        return json.loads(process.stdout.strip().splitlines()[-1])
+
+    def run(self, options):
+        """Замер в текущем процессе; WSGI — один синхронный воркер."""
+        setup_test_environment()
+        delay = options['db_latency'] / 1000
+
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(connection, **kwargs):
+            if slow_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_execute)
+
+        connection_created.connect(add_latency, weak=False)
+        paths = options['path'] or self.default_paths(options['token'])
+        headers = {}
+        if options['token']:
+            headers['AUTHORIZATION'] = f'Token {options["token"]}'
+        per_client = max(options['requests'] // options['concurrency'], 1)
+        total = per_client * options['concurrency']
+        plan = [
+            [paths[(client + index) % len(paths)] for index in range(
+                per_client
+            )]
+            for client in range(options['concurrency'])
+        ]
+        start = time.perf_counter()
+        if options['mode'] == 'wsgi':
+            timings, errors = self.run_wsgi(plan, headers)
+        else:
+            timings, errors = asyncio.run(self.run_asgi(plan, headers))
+        elapsed = time.perf_counter() - start
+        timings.sort()
+        return {
+            'rps': total / elapsed,
+            'p50': timings[len(timings) // 2] * 1000,
+            'p99': timings[int(len(timings) * 0.99)] * 1000,
+            'errors': errors,
+            'rss_mb': resource.getrusage(
+                resource.RUSAGE_SELF
+            ).ru_maxrss / 1024,
+        }
+
+    def default_paths(self, token):
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        if recipe is None:
+            raise CommandError('Рецептов нет.')
+        paths = (
+            '/api/recipes/',
+            f'/api/recipes/{recipe.pk}/',
+            '/api/tags/',
+        )
+        if token:
+            # Потоковый ответ: тело читается из БД уже после заголовков.
+            paths += ('/api/recipes/download_shopping_cart/?format=csv',)
+        return paths
+
+    def run_wsgi(self, plan, headers):
+        """
+        Синхронный воркер обслуживает один запрос за раз: клиенты ждут
+        блокировку, и это ожидание входит во время ответа.
+        """
+        worker = threading.Lock()
+        timings = []
+        errors = []
+        headers = {f'HTTP_{name}': value for name, value in headers.items()}
+
+        def client(paths):
+            http = Client()
+            for path in paths:
+                start = time.perf_counter()
+                with worker:
+                    response = http.get(path, **headers)
+                    # Как в конце запроса на сервере: тестовый клиент
+                    # отключает этот обработчик request_finished.
+                    close_old_connections()
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors.append(path)
+
+        with ThreadPoolExecutor(len(plan)) as executor:
+            list(executor.map(client, plan))
+        return timings, len(errors)
+
+    async def run_asgi(self, plan, headers):
+        """
+        Запросы идут в само ASGI-приложение, а не в AsyncClient: тот
+        читает потоковые ответы в потоке, а сервер — в цикле событий.
+        """
+        from foodgram.asgi import application
+
+        timings = []
+        errors = []
+        headers = [
+            (name.lower().encode(), value.encode())
+            for name, value in headers.items()
+        ]
+
+        async def client(paths):
+            for path in paths:
+                start = time.perf_counter()
+                ok = await asgi_get(application, path, headers)
+                timings.append(time.perf_counter() - start)
+                if not ok:
+                    errors.append(path)
+
+        await asyncio.gather(*(client(paths) for paths in plan))
+        return timings, len(errors)
@@ -0,0 +1,171 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+from foodgram.db.pool import POOLS, get_stats
+from recipes.models import Ingredient, Tag
+
+# Переменные окружения каждого режима, см. DATABASES в settings.py.
+MODES = {
+    'fresh': {'DB_CONN_MAX_AGE': '0', 'DB_POOL_MAX_SIZE': '0'},
+    'persistent': {
+        'DB_CONN_MAX_AGE': '600',
+        'DB_CONN_HEALTH_CHECKS': '1',
+        'DB_POOL_MAX_SIZE': '0',
+    },
+    'pool': {'DB_CONN_MAX_AGE': '0', 'DB_CONN_HEALTH_CHECKS': '0'},
+}
+
+
+class Command(BaseCommand):
+    help = '''Задержка простых маршрутов при разных режимах соединений.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--pool-size',
+            type=int,
+            default=8,
+            help='DB_POOL_MAX_SIZE для режима pool.',
+        )
+        parser.add_argument(
+            '--connect-latency',
+            type=float,
+            default=0,
+            help='Добавочное время открытия соединения в мс: TCP, '
+                 'аутентификация и запуск процесса PostgreSQL.',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            help='Маршрут для замера; по умолчанию тег и ингредиент.',
+        )
+        parser.add_argument('--mode', choices=MODES, help='Служебный.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                '--requests и --concurrency должны быть больше нуля.'
+            )
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run(options)))
+            return
+        for mode in MODES:
+            result = self.spawn(mode, options)
+            self.stdout.write(
+                f'{mode}: p50 {result["p50"]:.2f} мс, '
+                f'p99 {result["p99"]:.2f} мс, '
+                f'{result["rps"]:.0f} запросов/с, '
+                f'соединений открыто {result["opened"]}'
+            )
+            for alias, stats in result['pools'].items():
+                self.stdout.write(
+                    f'  пул {alias}: ожиданий {stats["waited"]}, '
+                    f'максимум {stats["wait_ms_max"]:.1f} мс, '
+                    f'таймаутов {stats["timeouts"]}'
+                )
+
+    def spawn(self, mode, options):
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'),
+            'bench_db_connections', '--mode', mode,
+            '--requests', str(options['requests']),
+            '--concurrency', str(options['concurrency']),
+            '--connect-latency', str(options['connect_latency']),
+        ]
+        for path in options['path'] or ():
+            command += ['--path', path]
+        env = dict(os.environ, **MODES[mode])
+        if mode == 'pool':
+            env['DB_POOL_MAX_SIZE'] = str(options['pool_size'])
+        process = subprocess.run(
+            command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr)
+        return json.loads(process.stdout.strip().splitlines()[-1])
+
+    def run(self, options):
+        setup_test_environment()
+        paths = options['path'] or self.default_paths()
+        # Соединение основного потока возвращается в пул.
+        close_old_connections()
+        delay = options['connect_latency'] / 1000
+        opened = []
+        timings = []
+
+        def client(index):
+            connection = connections['default']
+            open_connection = connection.open_connection
+
+            def slow_open(conn_params):
+                time.sleep(delay)
+                opened.append(1)
+                return open_connection(conn_params)
+
+            http = Client()
+            # Прогрев потока: первый запрос загружает URLconf, переводы
+            # и представления и в замер не входит.
+            http.get(paths[0])
+            close_old_connections()
+            connection.open_connection = slow_open
+            ready.wait()
+            go.wait()
+            for number in range(index, options['requests'],
+                                options['concurrency']):
+                start = time.perf_counter()
+                # Тестовый клиент не закрывает соединения сам: начало и
+                # конец запроса обрабатываются как на сервере.
+                close_old_connections()
+                response = http.get(paths[number % len(paths)])
+                close_old_connections()
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{paths[number % len(paths)]}: '
+                        f'{response.status_code}'
+                    )
+            connection.close()
+
+        ready = threading.Barrier(options['concurrency'] + 1)
+        go = threading.Barrier(options['concurrency'] + 1)
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            futures = [
+                executor.submit(client, index)
+                for index in range(options['concurrency'])
+            ]
+            ready.wait()
+            for pool in POOLS.values():
+                pool.reset_stats()
+            go.wait()
+            start = time.perf_counter()
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+        timings.sort()
+        return {
+            'p50': timings[len(timings) // 2] * 1000,
+            'p99': timings[int(len(timings) * 0.99)] * 1000,
+            'rps': len(timings) / elapsed,
+            'opened': len(opened),
+            'pools': get_stats(),
+        }
+
+    def default_paths(self):
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if tag is None or ingredient is None:
+            raise CommandError('Нет тегов или ингредиентов.')
+        return (f'/api/tags/{tag.pk}/', f'/api/ingredients/{ingredient.pk}/')
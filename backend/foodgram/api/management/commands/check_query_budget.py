@@ -0,0 +1,468 @@
+import json
+import math
+import shutil
+import tempfile
+import time
+import traceback
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment
+)
+from django.test import Client
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Cart, Favorite, Ingredient, IngredientRecipe, Recipe, Tag
+)
+from recipes.shopping_list import rebuild_shopping_lists
+from recipes.timelines import backfill
+from users.models import Follow, User
+
+BUDGET_FILE = settings.BASE_DIR / 'data' / 'query_budget.json'
+
+# Запас по времени при перезаписи бюджета: время запроса к БД нестабильно.
+TIME_HEADROOM = 5
+MIN_TIME_BUDGET_MS = 50
+
+USERS = 8
+TAGS = 3
+INGREDIENTS = 50
+RECIPES_PER_AUTHOR = 4
+INGREDIENTS_PER_RECIPE = 8
+
+IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+IMAGE_BASE64 = (
+    'data:image/gif;base64,'
+    'R0lGODlhAQABAAAAACH5BAEKAAEALAAAAAABAAEAAAICTAEAOw=='
+)
+
+# Маршруты проверяются по порядку: пишущие запросы меняют данные,
+# поэтому удаление идёт после создания. Четвёртое поле — клиент:
+# True — пользователь с данными, False — аноним, 'stranger' — автор
+# без подписок и избранного.
+ROUTES = (
+    ('ingredients-list', 'get', '/api/ingredients/', True, None),
+    ('ingredients-search', 'get', '/api/ingredients/?name=ингр', True, None),
+    ('ingredients-detail', 'get', '/api/ingredients/{ingredient}/', True,
+     None),
+    ('tags-list', 'get', '/api/tags/', True, None),
+    ('tags-detail', 'get', '/api/tags/{tag}/', True, None),
+    ('recipes-list-anonymous', 'get', '/api/recipes/', False, None),
+    ('recipes-list', 'get', '/api/recipes/', True, None),
+    ('recipes-list-filtered', 'get',
+     '/api/recipes/?tags={tag_slug}&is_favorited=1', True, None),
+    ('recipes-search', 'get', '/api/recipes/?search=рецепт', True, None),
+    ('recipes-by-ingredients', 'get',
+     '/api/recipes/by_ingredients/?have={ingredients}', False, None),
+    ('recipes-feed', 'get', '/api/recipes/feed/', True, None),
+    ('recipes-similar', 'get', '/api/recipes/{recipe}/similar/', False,
+     None),
+    ('recipes-detail', 'get', '/api/recipes/{recipe}/', True, None),
+    ('recipes-create', 'post', '/api/recipes/', True, 'recipe_payload'),
+    ('recipes-update', 'patch', '/api/recipes/{own_recipe}/', True,
+     'recipe_payload'),
+    ('recipes-favorite-add', 'post', '/api/recipes/{recipe}/favorite/', True,
+     None),
+    ('recipes-favorite-delete', 'delete', '/api/recipes/{recipe}/favorite/',
+     True, None),
+    ('recipes-cart-add', 'post', '/api/recipes/{recipe}/shopping_cart/',
+     True, None),
+    ('recipes-cart-delete', 'delete', '/api/recipes/{recipe}/shopping_cart/',
+     True, None),
+    ('recipes-favorite-bulk-add', 'post', '/api/recipes/favorite/', True,
+     'recipes_payload'),
+    ('recipes-favorite-bulk-delete', 'delete', '/api/recipes/favorite/',
+     True, 'recipes_payload'),
+    ('recipes-cart-bulk-add', 'post', '/api/recipes/shopping_cart/', True,
+     'recipes_payload'),
+    ('recipes-cart-bulk-delete', 'delete', '/api/recipes/shopping_cart/',
+     True, 'recipes_payload'),
+    ('recipes-shopping-list', 'get', '/api/recipes/shopping_list/', True,
+     None),
+    ('recipes-download-cart', 'get', '/api/recipes/download_shopping_cart/',
+     True, None),
+    ('recipe-favorites-list', 'get', '/api/api/recipes/{recipe}/favorite/',
+     True, None),
+    ('recipes-delete', 'delete', '/api/recipes/{own_recipe}/', True, None),
+    ('users-list', 'get', '/api/users/', True, None),
+    ('users-detail', 'get', '/api/users/{author}/', True, None),
+    ('users-me', 'get', '/api/users/me/', True, None),
+    ('users-subscriptions', 'get', '/api/users/subscriptions/', True, None),
+    ('users-subscriptions-empty', 'get', '/api/users/subscriptions/',
+     'stranger', None),
+    ('users-subscriptions-empty-cursor', 'get',
+     '/api/users/subscriptions/?cursor=', 'stranger', None),
+    ('users-subscribe', 'post', '/api/users/{stranger}/subscribe/', True,
+     None),
+    ('users-unsubscribe', 'delete', '/api/users/{stranger}/subscribe/', True,
+     None),
+    ('users-create', 'post', '/api/users/', False, 'user_payload'),
+    ('token-login', 'post', '/api/auth/token/login/', False, 'login_payload'),
+)
+
+# Списки с пагинацией дополнительно выполняются с двумя значениями limit:
+# число запросов не должно зависеть от размера страницы.
+PAGED_ROUTES = (
+    'recipes-list-anonymous',
+    'recipes-list',
+    'recipes-list-filtered',
+    'recipes-search',
+    'recipes-feed',
+    'users-list',
+    'users-subscriptions',
+)
+PAGE_LIMITS = (2, 10)
+
+# Страницы админки открываются суперпользователем.
+ADMIN_ROUTES = (
+    ('admin-recipes-list', '/admin/recipes/recipe/'),
+    ('admin-recipes-search', '/admin/recipes/recipe/?q=Рецепт'),
+    ('admin-recipes-change', '/admin/recipes/recipe/{recipe}/change/'),
+    ('admin-ingredients-list', '/admin/recipes/ingredient/'),
+    ('admin-ingredients-change',
+     '/admin/recipes/ingredient/{ingredient}/change/'),
+    ('admin-ingredients-autocomplete',
+     '/admin/autocomplete/?term=ингр&app_label=recipes'
+     '&model_name=ingredientrecipe&field_name=ingredient'),
+    ('admin-tags-change', '/admin/recipes/tag/{tag}/change/'),
+    ('admin-favorites-list', '/admin/recipes/favorite/'),
+    ('admin-carts-list', '/admin/recipes/cart/'),
+    ('admin-users-list', '/admin/users/user/'),
+    ('admin-follows-list', '/admin/users/follow/'),
+)
+
+
+class QueryRecorder:
+    """Запоминает SQL, время и стек вызова каждого запроса к БД."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        stack = traceback.extract_stack()[:-1]
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'time': time.perf_counter() - start,
+                'stack': stack,
+            })
+
+    @property
+    def duplicates(self):
+        counter = Counter(query['sql'] for query in self.queries)
+        return sum(count - 1 for count in counter.values())
+
+    @property
+    def time_ms(self):
+        return sum(query['time'] for query in self.queries) * 1000
+
+
+class Command(BaseCommand):
+    help = '''Проверка числа SQL-запросов и времени БД для API и админки.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Перезаписать файл бюджета по результатам замеров.',
+        )
+        parser.add_argument(
+            '--budget',
+            default=BUDGET_FILE,
+            help='Путь к файлу бюджета.',
+        )
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            # Запросы считаются на основной БД: реплики не используются.
+            with override_settings(MEDIA_ROOT=media_root,
+                                   DATABASE_REPLICAS=[]):
+                results, pages = self.measure()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self.check_pages(pages)
+        if options['update']:
+            self.write_budget(options['budget'], results)
+            return
+        self.check_budget(options['budget'], results)
+
+    def seed(self):
+        """Наполнение тестовой БД данными, похожими на рабочие."""
+        users = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@foodgram.ru',
+                password='budget-password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for index in range(USERS)
+        ]
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', color=f'#0000{index:02}',
+                slug=f'tag{index}')
+            for index in range(TAGS)
+        )
+        tags = list(Tag.objects.all())
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(INGREDIENTS)
+        )
+        ingredients = list(Ingredient.objects.all())
+        for author in users:
+            for index in range(RECIPES_PER_AUTHOR):
+                recipe = Recipe(
+                    author=author,
+                    name=f'Рецепт {author.id}-{index}',
+                    text='Описание',
+                    cooking_time=10,
+                )
+                recipe.image.save('budget.gif', ContentFile(IMAGE))
+                recipe.tags.set(tags[:index % TAGS + 1])
+                IngredientRecipe.objects.bulk_create(
+                    IngredientRecipe(
+                        recipe=recipe,
+                        ingredient=ingredients[
+                            (recipe.id + offset) % INGREDIENTS
+                        ],
+                        amount=offset + 1,
+                    )
+                    for offset in range(INGREDIENTS_PER_RECIPE)
+                )
+        user, *authors = users
+        recipes = Recipe.objects.exclude(author=user)
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe=recipe) for recipe in recipes[::2]
+        )
+        Cart.objects.bulk_create(
+            Cart(user=user, recipe=recipe) for recipe in recipes[::3]
+        )
+        rebuild_shopping_lists((user.pk,))
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author) for author in authors[:-1]
+        )
+        for author in authors[:-1]:
+            backfill(user, author)
+        recipe = Recipe.objects.exclude(author=user).exclude(
+            favorites__user=user
+        ).exclude(carts__user=user).first()
+        superuser = User.objects.create_superuser(
+            username='admin',
+            email='admin@foodgram.ru',
+            password='budget-password',
+        )
+        return user, superuser, {
+            'ingredient': ingredients[0].id,
+            'ingredients': ','.join(
+                str(ingredient.id) for ingredient in ingredients[:5]
+            ),
+            'tag': tags[0].id,
+            'tag_slug': tags[0].slug,
+            'recipe': recipe.id,
+            'own_recipe': user.recipes.first().id,
+            'recipes_payload': {
+                'recipes': list(recipes.values_list('id', flat=True)[:20]),
+            },
+            'author': authors[0].id,
+            'stranger': authors[-1].id,
+            'recipe_payload': {
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 5}
+                    for ingredient in ingredients[:INGREDIENTS_PER_RECIPE]
+                ],
+                'tags': [tag.id for tag in tags],
+                'image': IMAGE_BASE64,
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'cooking_time': 15,
+            },
+            'user_payload': {
+                'email': 'new@foodgram.ru',
+                'username': 'new',
+                'first_name': 'Имя',
+                'last_name': 'Фамилия',
+                'password': 'budget-password',
+            },
+            'login_payload': {
+                'email': user.email,
+                'password': 'budget-password',
+            },
+        }
+
+    def measure(self):
+        """Выполнение всех маршрутов с записью запросов к БД."""
+        user, superuser, fixture = self.seed()
+        client = APIClient()
+        client.force_authenticate(user)
+        stranger = APIClient()
+        stranger.force_authenticate(User.objects.get(pk=fixture['stranger']))
+        clients = {True: client, False: APIClient(), 'stranger': stranger}
+        results = {}
+        for name, method, url, authenticated, payload in ROUTES:
+            url = url.format(**fixture)
+            data = fixture[payload] if payload else None
+            results[name] = self.record(
+                name, method, url,
+                lambda: getattr(clients[authenticated], method)(
+                    url, data, format='json'
+                )
+            )
+        admin = Client()
+        admin.force_login(superuser)
+        for name, url in ADMIN_ROUTES:
+            url = url.format(**fixture)
+            results[name] = self.record(
+                name, 'get', url, lambda: admin.get(url)
+            )
+        return results, self.measure_pages(clients, fixture)
+
+    def measure_pages(self, clients, fixture):
+        """
+        Число запросов списков при разных limit. Каждый замер идёт с
+        пустым кэшем процесса, чтобы попадания в кэш фрагментов не
+        скрыли запросы, растущие с размером страницы.
+        """
+        pages = {}
+        for name, method, url, authenticated, payload in ROUTES:
+            if name not in PAGED_ROUTES:
+                continue
+            url = url.format(**fixture)
+            separator = '&' if '?' in url else '?'
+            pages[name] = {}
+            for limit in PAGE_LIMITS:
+                paged_url = f'{url}{separator}limit={limit}'
+                with override_settings(CACHES={'default': {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': f'check-query-budget-{name}-{limit}',
+                }}):
+                    recorder = self.record(
+                        name, method, paged_url,
+                        lambda: getattr(clients[authenticated], method)(
+                            paged_url
+                        )
+                    )
+                pages[name][limit] = len(recorder.queries)
+        return pages
+
+    def check_pages(self, pages):
+        failed = []
+        for name, counts in pages.items():
+            line = f'{name}: ' + ', '.join(
+                f'limit={limit} — {count} запросов'
+                for limit, count in counts.items()
+            )
+            if len(set(counts.values())) == 1:
+                self.stdout.write(line)
+                continue
+            failed.append(name)
+            self.stdout.write(self.style.ERROR(
+                f'{line} — число запросов зависит от размера страницы'
+            ))
+        if failed:
+            raise CommandError(
+                'Число запросов зависит от размера страницы: '
+                f'{", ".join(failed)}'
+            )
+
+    def record(self, name, method, url, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = request()
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{name}: {method.upper()} {url} вернул '
+                f'{response.status_code}: {response.content[:500]}'
+            )
+        return recorder
+
+    def write_budget(self, path, results):
+        budget = {
+            name: {
+                'queries': len(recorder.queries),
+                'duplicates': recorder.duplicates,
+                'time_ms': max(
+                    MIN_TIME_BUDGET_MS,
+                    math.ceil(recorder.time_ms * TIME_HEADROOM),
+                ),
+            }
+            for name, recorder in results.items()
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(budget, file, indent=4, sort_keys=True)
+            file.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Бюджет записан в {path}'))
+
+    def check_budget(self, path, results):
+        with open(path, encoding='utf-8') as file:
+            budget = json.load(file)
+        failed = []
+        for name, recorder in results.items():
+            measured = {
+                'queries': len(recorder.queries),
+                'duplicates': recorder.duplicates,
+                'time_ms': recorder.time_ms,
+            }
+            limits = budget.get(name)
+            line = (f'{name}: {measured["queries"]} запросов, '
+                    f'{measured["duplicates"]} повторов, '
+                    f'{measured["time_ms"]:.1f} мс')
+            if limits is None:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f'{line} — нет в бюджете'))
+                continue
+            exceeded = [
+                key for key, value in measured.items() if value > limits[key]
+            ]
+            if not exceeded:
+                self.stdout.write(line)
+                continue
+            failed.append(name)
+            self.stdout.write(self.style.ERROR(
+                f'{line} — превышен бюджет {limits}'
+            ))
+            self.print_queries(recorder)
+        if failed:
+            raise CommandError(
+                f'Превышен бюджет запросов: {", ".join(failed)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджет запросов соблюдён.'))
+
+    def print_queries(self, recorder):
+        counter = Counter(query['sql'] for query in recorder.queries)
+        base_dir = str(settings.BASE_DIR)
+        skipped = (__file__, str(settings.BASE_DIR / 'manage.py'))
+        for query in recorder.queries:
+            mark = ' [повтор]' if counter[query['sql']] > 1 else ''
+            self.stdout.write(
+                f'\n  {query["time"] * 1000:.2f} мс{mark}: {query["sql"]}'
+            )
+            for frame in query['stack']:
+                if (frame.filename.startswith(base_dir)
+                        and frame.filename not in skipped):
+                    self.stdout.write(
+                        f'    {frame.filename}:{frame.lineno} in {frame.name}'
+                    )
@@ -0,0 +1,87 @@
+import gzip
+import threading
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from foodgram.db.routers import use_primary
+from recipes.indexes import get_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых q=0."""
+    encodings = set()
+    for part in header.split(','):
+        name, _, params = part.partition(';')
+        quality = params.replace(' ', '').lower()
+        if quality.startswith('q=') and not quality[2:].strip('0.'):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+class PrerenderedListMixin:
+    """
+    Список справочника отдаётся заранее отрендеренным JSON.
+    Тело и его сжатые копии хранятся в памяти процесса до смены версии
+    данных (version_key); запрос с совпадающим If-None-Match получает
+    304 без обращения к БД и сериализатору. Тело рендерит один поток,
+    параллельные запросы процесса ждут его, а не рендерят то же самое.
+    """
+    version_key = None
+    prerendered = {}
+    render_lock = threading.Lock()
+
+    def list(self, request, *args, **kwargs):
+        version = get_version(self.version_key)
+        etag = f'"{self.version_key}:{version}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        cached = self.prerendered.get(self.version_key)
+        if cached is None or cached[0] != version:
+            with self.render_lock:
+                cached = self.prerendered.get(self.version_key)
+                if cached is None or cached[0] != version:
+                    cached = (version, self.render_bodies())
+                    self.prerendered[self.version_key] = cached
+        bodies = cached[1]
+
+        encodings = accepted_encodings(
+            request.headers.get('Accept-Encoding', '')
+        )
+        encoding = next(
+            (name for name in ('br', 'gzip')
+             if name in encodings and name in bodies),
+            None
+        )
+        response = HttpResponse(
+            bodies[encoding], content_type='application/json'
+        )
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def render_bodies(self):
+        """JSON списка без сжатия, в gzip и, если доступен, в brotli."""
+        serializer = self.get_serializer(
+            self.filter_queryset(self.get_queryset()), many=True
+        )
+        # Тело живёт до смены версии и не должно отставать от неё.
+        with use_primary():
+            body = JSONRenderer().render(serializer.data)
+        bodies = {None: body, 'gzip': gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body)
+        return bodies
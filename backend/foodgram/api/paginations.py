@@ -1,6 +1,154 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def approximate_count(queryset):
+    """
+    Оценка числа строк по плану запроса PostgreSQL без COUNT(*).
+    На других СУБД возвращается точное значение.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def keyset_after(ordering, position):
+    """Условие «строго после позиции» для составного ключа."""
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+class ApproximateCountPaginator(Paginator):
+    """Пагинатор с оценочным числом объектов."""
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничная пагинация; с параметром cursor — пагинация по ключу.
+    В режиме cursor нет OFFSET и COUNT(*): страница выбирается условием
+    по полям view.keyset_ordering, для которых должен быть индекс.
+    Параметр count=approximate заменяет COUNT(*) оценкой планировщика.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Некорректный курсор.'
+    count = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = request.query_params.get(self.count_query_param)
+        if self.count_mode == 'approximate':
+            self.django_paginator_class = ApproximateCountPaginator
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.count = None
+        if self.count_mode == 'approximate':
+            self.count = approximate_count(queryset)
+        elif self.count_mode == 'exact':
+            self.count = queryset.count()
+
+        ordering = getattr(view, 'keyset_ordering', ('pk',))
+        queryset = queryset.order_by(*ordering)
+        return self.paginate_keyset(
+            request,
+            ordering,
+            lambda position, size: list((
+                queryset.filter(keyset_after(ordering, position))
+                if position else queryset
+            )[:size]),
+            queryset.model,
+        )
+
+    def paginate_keyset(self, request, ordering, fetch, model):
+        """
+        Страница из fetch(position, size): не более size объектов строго
+        после позиции position (None — с начала) в порядке ordering.
+        Значения позиции приводятся к типам полей ordering модели model.
+        """
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = ordering
+        cursor = request.query_params.get(self.cursor_query_param)
+        position = self.decode(cursor, model) if cursor else None
+        page = fetch(position, self.page_size + 1)
+        self.next_position = None
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            self.next_position = [
+                getattr(page[-1], field.lstrip('-'))
+                for field in self.ordering
+            ]
+        return page
+
+    def encode(self, position):
+        data = json.dumps(position, default=str).encode()
+        return urlsafe_b64encode(data).decode()
+
+    def decode(self, cursor, model):
+        try:
+            position = json.loads(urlsafe_b64decode(cursor.encode()))
+        except (Base64Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+                len(position) != len(self.ordering)) or None in position:
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
@@ -1,6 +1,5 @@
 from django.core.validators import MinValueValidator
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 from rest_framework.validators import (
@@ -9,7 +8,10 @@ from rest_framework.validators import (
     ValidationError
 )
 
+from api.fields import ImageVariantsField, RecipeImageField
+from api.fragments import get_fragments, refresh_content
 from foodgram.settings import (
+    BULK_RECIPES_MAX,
     TAG_NAME_MAX_LENGTH,
     TAG_SLUG_MAX_LENGTH,
     MIN_COOKING_TIME,
@@ -21,9 +23,13 @@ from recipes.models import (
     Ingredient,
     IngredientRecipe,
     Recipe,
-    Tag
+    ShoppingListItem,
+    Tag,
+    TagRecipe
 )
-from users.serializers import UserSerializer
+from recipes.shopping_list import change_recipe_in_shopping_lists
+from recipes.timelines import fan_out
+from users.serializers import RecipesBriefSerializer, UserSerializer
 
 
 class IngredientSerializer(ModelSerializer):
@@ -47,10 +53,12 @@ class IngredientRecipeSerializer(ModelSerializer):
 
 
 class WriteIngredientRecipeSerializer(ModelSerializer):
-    """Сериализатор для записи модели IngredientRecipe."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    """
+    Сериализатор для записи модели IngredientRecipe.
+    Существование ингредиентов проверяет WriteRecipeSerializer
+    одним запросом на весь рецепт.
+    """
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         validators=(
             MinValueValidator(
@@ -65,6 +73,19 @@ class WriteIngredientRecipeSerializer(ModelSerializer):
         fields = ('id', 'amount')
 
 
+class ShoppingListItemSerializer(ModelSerializer):
+    """Сериализатор модели ShoppingListItem."""
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+    id = serializers.ReadOnlyField(source='ingredient.id')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount',)
+
+
 class TagSerializer(ModelSerializer):
     """Сериализатор модели Tag."""
     name = serializers.CharField(
@@ -81,8 +102,48 @@ class TagSerializer(ModelSerializer):
         fields = '__all__'
 
 
+class RecipeFragmentSerializer(ModelSerializer):
+    """
+    Не зависящая от пользователя часть рецепта.
+    Результат кэшируется, см. api.fragments.
+    """
+    tags = TagSerializer(many=True, read_only=True)
+    ingredients = IngredientRecipeSerializer(
+        many=True,
+        source='ingredientrecipes',
+        read_only=True
+    )
+    image = RecipeImageField()
+    image_variants = ImageVariantsField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'tags',
+            'ingredients',
+            'name',
+            'image',
+            'image_variants',
+            'text',
+            'cooking_time',
+        )
+        read_only_fields = fields
+
+
+class ReadRecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов собирается из фрагментов одним обращением к кэшу."""
+
+    def to_representation(self, data):
+        return self.child.to_representation_many(list(data))
+
+
 class ReadRecipeSerializer(ModelSerializer):
-    """Сериализатор для получения информации из модели Recipe."""
+    """
+    Сериализатор для получения информации из модели Recipe.
+    Общая часть рецепта берётся из кэша фрагментов, поверх неё
+    добавляются автор и признаки текущего пользователя.
+    """
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     ingredients = IngredientRecipeSerializer(
@@ -90,7 +151,8 @@ class ReadRecipeSerializer(ModelSerializer):
         source='ingredientrecipes',
         read_only=True
     )
-    image = Base64ImageField()
+    image = RecipeImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited'
     )
@@ -109,16 +171,43 @@ class ReadRecipeSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
         read_only_fields = fields
+        list_serializer_class = ReadRecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
+
+    def to_representation_many(self, recipes):
+        """Фрагменты рецептов с автором и признаками пользователя."""
+        fragments = get_fragments(
+            recipes, RecipeFragmentSerializer, self.context
+        )
+        result = []
+        for recipe in recipes:
+            if hasattr(recipe, 'author_is_subscribed'):
+                recipe.author.is_subscribed = recipe.author_is_subscribed
+            data = {
+                **fragments[recipe.pk],
+                'author': UserSerializer(
+                    recipe.author, context=self.context
+                ).data,
+                'is_favorited': self.get_is_favorited(recipe),
+                'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+            }
+            result.append({field: data[field] for field in self.Meta.fields})
+        return result
 
     def get_is_favorited(self, obj):
         """Рецепт в избранном или нет."""
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return Favorite.objects.filter(user=request.user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
@@ -126,6 +215,8 @@ class ReadRecipeSerializer(ModelSerializer):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return Cart.objects.filter(user=request.user, recipe=obj).exists()
 
 
@@ -135,10 +226,8 @@ class WriteRecipeSerializer(ModelSerializer):
         many=True,
         source='ingredientrecipes',
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
-    image = Base64ImageField()
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = RecipeImageField()
     cooking_time = serializers.IntegerField(
         validators=(
             MinValueValidator(
@@ -159,18 +248,91 @@ class WriteRecipeSerializer(ModelSerializer):
             'cooking_time'
         )
 
+    @staticmethod
+    def check_ids(model, ids, message):
+        """Проверка списка id одним запросом: без повторов и пропусков."""
+        if len(set(ids)) != len(ids):
+            raise ValidationError(message)
+        missing = set(ids) - set(
+            model.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        if missing:
+            raise ValidationError(
+                f'Не найдены id: {", ".join(map(str, sorted(missing)))}.'
+            )
+
+    def validate(self, data):
+        """Теги и ингредиенты должны существовать и не повторяться."""
+        if 'tags' in data:
+            self.check_ids(Tag, data['tags'], 'Теги не должны повторяться.')
+        if 'ingredientrecipes' in data:
+            self.check_ids(
+                Ingredient,
+                [ingredient['id'] for ingredient in data['ingredientrecipes']],
+                'Такой ингредиент уже есть.'
+            )
+        return data
+
     def create_ingredient_amount(self, ingredients, recipe):
         """Создание записей ингредиент - рецепт - количество."""
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            ingredient = ingredient['id']
-            _, created = IngredientRecipe.objects.get_or_create(
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
                 recipe=recipe,
-                ingredient=ingredient,
-                amount=amount
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
             )
-            if not created:
-                raise ValidationError('Такой ингредиент уже есть.')
+            for ingredient in ingredients
+        )
+
+    def update_ingredient_amount(self, ingredients, recipe):
+        """
+        Изменение только тех ингредиентов рецепта, что поменялись.
+        Списки покупок с этим рецептом пересчитываются в той же транзакции.
+        """
+        existing = {
+            ingredient_recipe.ingredient_id: ingredient_recipe
+            for ingredient_recipe in recipe.ingredientrecipes.all()
+        }
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = existing.keys() - amounts.keys()
+        changed = []
+        for ingredient_id, ingredient_recipe in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != ingredient_recipe.amount:
+                ingredient_recipe.amount = amount
+                changed.append(ingredient_recipe)
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in existing
+        ]
+        if not (removed or changed or added):
+            return
+        change_recipe_in_shopping_lists(recipe.pk, -1)
+        if removed:
+            recipe.ingredientrecipes.filter(ingredient_id__in=removed).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        self.create_ingredient_amount(added, recipe)
+        change_recipe_in_shopping_lists(recipe.pk, 1)
+
+    def create_tags(self, tags, recipe):
+        """Создание записей тег - рецепт."""
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag) for tag in tags
+        )
+
+    def update_tags(self, tags, recipe):
+        """Изменение только тех тегов рецепта, что поменялись."""
+        existing = set(
+            recipe.tag_recipes.values_list('tag_id', flat=True)
+        )
+        removed = existing - set(tags)
+        if removed:
+            recipe.tag_recipes.filter(tag_id__in=removed).delete()
+        self.create_tags([tag for tag in tags if tag not in existing], recipe)
 
     @transaction.atomic
     def create(self, validated_data):
@@ -179,21 +341,68 @@ class WriteRecipeSerializer(ModelSerializer):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredientrecipes')
         recipe = Recipe.objects.create(author=request.user, **validated_data)
-        recipe.tags.set(tags)
+        self.create_tags(tags, recipe)
         self.create_ingredient_amount(ingredients, recipe)
+        fan_out(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         """Обновление рецепта."""
-        ingredients = validated_data.pop('ingredientrecipes')
-        tags = validated_data.pop('tags')
-        instance.ingredients.clear()
-        self.create_ingredient_amount(ingredients, instance)
-        instance.tags.clear()
-        instance.tags.set(tags)
+        ingredients = validated_data.pop('ingredientrecipes', None)
+        tags = validated_data.pop('tags', None)
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+            validated_data['image_pending'] = True
+        if ingredients is not None:
+            self.update_ingredient_amount(ingredients, instance)
+        if tags is not None:
+            self.update_tags(tags, instance)
         return super().update(instance, validated_data)
 
+    def to_representation(self, instance):
+        """
+        Ответ в формате ReadRecipeSerializer. Изменённый рецепт уже выбран
+        with_flags с признаками пользователя; после записи заново
+        выбираются только его теги и ингредиенты, из них и строится
+        фрагмент.
+        """
+        if not hasattr(instance, 'is_favorited'):
+            request = self.context.get('request')
+            instance = Recipe.objects.with_flags(request.user).get(
+                pk=instance.pk
+            )
+        refresh_content(instance)
+        return ReadRecipeSerializer(instance, context=self.context).data
+
+
+class RecipeCoverageSerializer(RecipesBriefSerializer):
+    """Рецепт с числом имеющихся и списком недостающих ингредиентов."""
+    matched = serializers.IntegerField(read_only=True)
+    missing = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipesBriefSerializer.Meta):
+        fields = RecipesBriefSerializer.Meta.fields + ('matched', 'missing')
+        read_only_fields = fields
+
+
+class SimilarRecipeSerializer(RecipesBriefSerializer):
+    """Похожий рецепт со степенью сходства."""
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(RecipesBriefSerializer.Meta):
+        fields = RecipesBriefSerializer.Meta.fields + ('score',)
+        read_only_fields = fields
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для добавления или удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX
+    )
+
 
 class FavoriteSerializer(ModelSerializer):
     """Сериализатор модели Favorite."""
@@ -221,6 +430,7 @@ class FavoriteSerializer(ModelSerializer):
             )
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создание записи favorite"""
         user = validated_data.get('user')
@@ -1,8 +1,15 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from foodgram.settings import ASGI_MODE
+
+from api import async_views
 from api.views import (
-    FavoriteViewSet, IngredientViewSet, RecipeViewSet, TagViewSet
+    FavoriteViewSet,
+    IngredientViewSet,
+    MetricsView,
+    RecipeViewSet,
+    TagViewSet
 )
 
 app_name = 'api'
@@ -18,5 +25,22 @@ router.register(
 )
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
 ]
+
+if ASGI_MODE:
+    # Горячие маршруты чтения обслуживаются асинхронными представлениями.
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path(
+            'recipes/download_shopping_cart/',
+            async_views.download_shopping_cart,
+        ),
+        path('tags/', async_views.tag_list),
+        path('tags/<int:pk>/', async_views.tag_detail),
+        path('ingredients/', async_views.ingredient_list),
+        path('ingredients/<int:pk>/', async_views.ingredient_detail),
+        path('users/subscriptions/', async_views.subscriptions),
+    ] + urlpatterns
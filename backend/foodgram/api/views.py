@@ -1,79 +1,165 @@
-from django.db.models import Sum
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.validators import ValidationError
+from rest_framework.views import APIView
 
+from recipes.indexes import (
+    INGREDIENTS_VERSION_KEY,
+    TAGS_VERSION_KEY,
+    ingredient_index,
+    recipe_ingredient_index
+)
+from foodgram.db.pool import get_stats as get_pool_stats
+from foodgram.settings import (
+    BY_INGREDIENTS_LIMIT,
+    BY_INGREDIENTS_MAX_LIMIT,
+    SIMILAR_RECIPES_LIMIT
+)
+from recipes.lists import add_recipes, remove_recipes
 from recipes.models import (
-    Cart, Favorite, Ingredient, IngredientRecipe, Recipe, Tag
+    Cart, Favorite, Ingredient, Recipe, ShoppingListItem, SimilarRecipe, Tag
 )
-from recipes.utils import convert_txt
+from recipes.timelines import FEED_ORDERING, feed_page
+from recipes.utils import SHOPPING_LIST_FORMATS, convert_shopping_list
+from users.authentication import get_stats as get_token_stats
 from users.serializers import RecipesBriefSerializer
+from api.fragments import get_stats
 from api.filters import IngredientSearchFilter, RecipeFilter
+from api.mixins import PrerenderedListMixin
 from api.paginations import CustomPagination
 from api.permissions import AuthorOrAdminOrReadOnly
 from api.serializers import (
     FavoriteSerializer,
     IngredientSerializer,
     ReadRecipeSerializer,
+    RecipeCoverageSerializer,
+    RecipeIdsSerializer,
+    ShoppingListItemSerializer,
+    SimilarRecipeSerializer,
     TagSerializer,
     WriteRecipeSerializer
 )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(PrerenderedListMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет ингридиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend, IngredientSearchFilter,)
     search_fields = ('^name',)
+    authentication_classes = ()
     permission_classes = (AllowAny,)
     pagination_class = None
+    version_key = INGREDIENTS_VERSION_KEY
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по началу названия обслуживается индексом в памяти."""
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not limit.isdigit() or int(limit) < 1:
+                raise ValidationError(
+                    {'limit': 'Должно быть целым положительным числом.'}
+                )
+            limit = int(limit)
+        return Response(ingredient_index.search(name, limit))
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(PrerenderedListMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    authentication_classes = ()
     permission_classes = (AllowAny,)
     pagination_class = None
+    version_key = TAGS_VERSION_KEY
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет рецептов."""
-    queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
-    paginations_class = CustomPagination
+    pagination_class = CustomPagination
+    keyset_ordering = ('-pub_date', '-id')
     permission_classes = (AuthorOrAdminOrReadOnly,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """
+        Рецепты с признаками для текущего пользователя. При чтении и
+        изменении остальное берётся из кэша фрагментов: изменение сверяет
+        только id тегов и ингредиентов, а ответ строится из выбранных
+        после записи данных.
+        """
+        if self.action in ('list', 'retrieve', 'update', 'partial_update'):
+            return Recipe.objects.with_flags(self.request.user)
+        return Recipe.objects.with_related(self.request.user)
+
+    def perform_content_negotiation(self, request, force=False):
+        """
+        Параметр format у выгрузки списка покупок задаёт формат файла,
+        а не рендерер DRF.
+        """
+        if self.action == 'download_shopping_cart':
+            force = True
+        return super().perform_content_negotiation(request, force)
+
     def get_serializer_class(self):
         """Выбор сериалайзера в зависимости от запроса."""
         if self.request.method in ('POST', 'PATCH', 'DELETE'):
             return WriteRecipeSerializer
         return ReadRecipeSerializer
 
+    def recipe_pk(self, pk):
+        """Числовой pk рецепта из URL."""
+        if not pk.isdigit():
+            raise NotFound
+        return int(pk)
+
     def add_recipe(self, model, request, pk):
-        """Добавление рецепта."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = self.request.user
-        _, created = model.objects.get_or_create(recipe=recipe, user=user)
-        if not created:
+        """
+        Добавление рецепта. Повторный и одновременный запросы
+        не создают дублей: запись идёт через ON CONFLICT DO NOTHING.
+        """
+        pk = self.recipe_pk(pk)
+        if not add_recipes(model, request.user, (pk,)):
+            get_object_or_404(Recipe, pk=pk)
             raise ValidationError('Такой рецепт уже существует!')
-        serializer = RecipesBriefSerializer(recipe)
+        serializer = RecipesBriefSerializer(Recipe.objects.get(pk=pk))
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_recipe(self, model, request, pk):
         """Удаление рецепта."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = self.request.user
-        obj = get_object_or_404(model, recipe=recipe, user=user)
-        obj.delete()
+        pk = self.recipe_pk(pk)
+        if not remove_recipes(model, request.user, (pk,)):
+            get_object_or_404(Recipe, pk=pk)
+            raise NotFound
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def change_recipes(self, model, request):
+        """
+        Добавление или удаление списка рецептов {"recipes": [id, ...]}
+        одним запросом к БД. В ответе id рецептов, которые действительно
+        были добавлены или удалены.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            added = add_recipes(model, request.user, recipe_ids)
+            return Response(
+                data={'recipes': added}, status=status.HTTP_201_CREATED
+            )
+        removed = remove_recipes(model, request.user, recipe_ids)
+        return Response(data={'recipes': removed})
+
     @action(
         detail=True,
         methods=('POST', 'DELETE'),
@@ -88,6 +174,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         else:
             return self.delete_recipe(Favorite, request, pk)
 
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_bulk(self, request):
+        """Добавление и удаление нескольких рецептов в избранное."""
+        return self.change_recipes(Favorite, request)
+
     @action(
         detail=True,
         methods=('POST', 'DELETE'),
@@ -102,6 +199,124 @@ class RecipeViewSet(viewsets.ModelViewSet):
         else:
             return self.delete_recipe(Cart, request, pk)
 
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='shopping_cart',
+        url_name='shopping_cart-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавление и удаление нескольких рецептов в список покупок."""
+        return self.change_recipes(Cart, request)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='by_ingredients',
+        url_name='by_ingredients',
+        permission_classes=(AllowAny,)
+    )
+    def by_ingredients(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов: рецепты по доле
+        ингредиентов из have, с перечнем недостающих.
+        """
+        have = request.query_params.get('have', '')
+        try:
+            items = [int(item) for item in have.split(',') if item.strip()]
+        except ValueError:
+            items = None
+        if not items or min(items) < 1:
+            raise ValidationError(
+                {'have': 'Укажите id ингредиентов через запятую.'}
+            )
+        try:
+            limit = int(request.query_params.get(
+                'limit', BY_INGREDIENTS_LIMIT
+            ))
+        except ValueError:
+            limit = None
+        if limit is None or not 1 <= limit <= BY_INGREDIENTS_MAX_LIMIT:
+            raise ValidationError({
+                'limit': f'Целое число от 1 до {BY_INGREDIENTS_MAX_LIMIT}.'
+            })
+        # Удалённые рецепты остаются в индексе до перестроения,
+        # поэтому кандидатов берётся с запасом.
+        ranked = recipe_ingredient_index.rank(items, limit * 2)
+        recipes = Recipe.objects.in_bulk([pk for pk, *_ in ranked])
+        ingredients = Ingredient.objects.in_bulk({
+            int(pk) for *_, missing in ranked for pk in missing
+        })
+        result = []
+        for pk, matched, missing in ranked:
+            recipe = recipes.get(pk)
+            if recipe is None:
+                continue
+            recipe.matched = matched
+            # Ингредиент мог быть удалён после построения индекса.
+            recipe.missing = [
+                ingredients[pk] for pk in missing.tolist()
+                if pk in ingredients
+            ]
+            result.append(recipe)
+        serializer = RecipeCoverageSerializer(
+            result[:limit], many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='feed',
+        url_name='feed',
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, от новых к старым, по курсору."""
+        user = request.user
+
+        def fetch(position, size):
+            pks = feed_page(user, position, size)
+            recipes = Recipe.objects.with_flags(user).in_bulk(pks)
+            return [recipes[pk] for pk in pks if pk in recipes]
+
+        page = self.paginator.paginate_keyset(
+            request, FEED_ORDERING, fetch, Recipe
+        )
+        serializer = ReadRecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=True,
+        methods=('get',),
+        url_path='similar',
+        url_name='similar',
+        permission_classes=(AllowAny,)
+    )
+    def similar(self, request, pk=None):
+        """
+        Похожие рецепты, заранее рассчитанные командой
+        compute_similar_recipes; один запрос по индексу (recipe, -score).
+        """
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound
+        similar = SimilarRecipe.objects.filter(recipe=pk).select_related(
+            'similar'
+        ).order_by('-score')[:SIMILAR_RECIPES_LIMIT]
+        recipes = []
+        for item in similar:
+            item.similar.score = item.score
+            recipes.append(item.similar)
+        serializer = SimilarRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
     @action(
         detail=False,
         methods=('get',),
@@ -111,14 +326,33 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         """Скачать список покупок."""
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__carts__user=request.user
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            raise ValidationError(
+                f'Доступные форматы: {", ".join(SHOPPING_LIST_FORMATS)}.'
+            )
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values(
             'ingredient__name', 'ingredient__measurement_unit'
         ).order_by(
             'ingredient__name'
-        ).annotate(ingredient_total=Sum('amount'))
-        return convert_txt(ingredients)
+        ).annotate(ingredient_total=F('amount'))
+        return convert_shopping_list(ingredients, file_format)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='shopping_list',
+        url_name='shopping_list',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_list(self, request):
+        """Текущий список покупок: сумма ингредиентов рецептов из Cart."""
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        return Response(ShoppingListItemSerializer(items, many=True).data)
 
 
 class FavoriteViewSet(viewsets.ModelViewSet):
@@ -131,3 +365,18 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         recipe_id = self.kwargs.get('recipe_id')
         recipe = get_object_or_404(Recipe, id=recipe_id)
         return recipe.favorites.all()
+
+
+class MetricsView(APIView):
+    """
+    Метрики процесса, который обслужил запрос: кэш фрагментов рецептов,
+    пулы соединений с БД и кэш токенов.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({
+            'fragments': get_stats(),
+            'db_pools': get_pool_stats(),
+            'tokens': get_token_stats(),
+        })
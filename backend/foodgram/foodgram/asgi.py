@@ -7,10 +7,31 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+# sync_to_async(thread_sensitive=False) выполняет чтение в пуле цикла
+# событий по умолчанию (см. api/async_views.py). Цикл создаёт сервер
+# после загрузки приложения, поэтому пул назначается при первом запросе.
+executor = ThreadPoolExecutor(
+    settings.ASGI_THREADS, thread_name_prefix='asgi-read'
+)
+configured_loop = None
+
+
+async def application(scope, receive, send):
+    global configured_loop
+    loop = asyncio.get_running_loop()
+    if loop is not configured_loop:
+        loop.set_default_executor(executor)
+        configured_loop = loop
+    await django_application(scope, receive, send)
@@ -0,0 +1,22 @@
+class DenormalizedFieldsMixin:
+    """
+    Поля DENORMALIZED_FIELDS (счётчики, отметки пересчётов) меняются
+    только через UPDATE ... SET F() + n и команды пересчёта. Обычный save
+    существующей строки их не пишет: иначе он вернул бы значения,
+    прочитанные в начале запроса, поверх параллельных изменений.
+    """
+    DENORMALIZED_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            skipped = {
+                *self.DENORMALIZED_FIELDS, *self.get_deferred_fields()
+            }
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+                and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
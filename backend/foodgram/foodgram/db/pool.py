@@ -0,0 +1,298 @@
+import threading
+import time
+from collections import deque
+
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    """Свободное соединение не появилось за время ожидания."""
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class Waiter:
+    """Запрос, ждущий соединение: его передают напрямую, без гонки."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.connection = None
+
+
+class ConnectionPool:
+    """
+    Пул соединений процесса, общий для всех потоков.
+    Держит не более max_size соединений, при первом обращении открывает
+    min_size. Соединение старше recycle секунд закрывается и заменяется
+    новым. Если мест нет, запрос ждёт не дольше timeout; освободившееся
+    соединение отдаётся ждущим по очереди.
+    """
+
+    def __init__(self, min_size=0, max_size=10, timeout=5, recycle=3600):
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.idle = deque()
+        self.waiters = deque()
+        self.opened_at = {}
+        self.size = 0
+        self.in_use = 0
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Обнуление счётчиков ожидания, открытий и закрытий."""
+        with self.lock:
+            self.acquired = 0
+            self.waited = 0
+            self.wait_time = 0.0
+            self.max_wait = 0.0
+            self.timeouts = 0
+            self.opened = 0
+            self.closed = 0
+
+    def hand_over(self, connection):
+        """
+        Соединение (или None — свободное место под новое) первому
+        ждущему. Вызывается под lock; False, если ждущих нет.
+        """
+        if not self.waiters:
+            return False
+        waiter = self.waiters.popleft()
+        waiter.connection = connection
+        self.in_use += 1
+        waiter.event.set()
+        return True
+
+    def open(self, connect):
+        """Новое соединение на уже занятом месте пула."""
+        try:
+            connection = connect()
+        except Exception:
+            self.free_slot()
+            raise
+        with self.lock:
+            self.opened_at[id(connection)] = time.monotonic()
+            self.opened += 1
+        return connection
+
+    def forget(self, connection):
+        """Закрытие соединения; место в пуле остаётся занятым."""
+        with self.lock:
+            self.opened_at.pop(id(connection), None)
+            self.closed += 1
+        close_quietly(connection)
+
+    def free_slot(self):
+        with self.lock:
+            if not self.hand_over(None):
+                self.size -= 1
+
+    def expired(self, connection):
+        opened_at = self.opened_at.get(id(connection), 0)
+        return time.monotonic() - opened_at >= self.recycle
+
+    def fill(self, connect):
+        """Открытие соединений до min_size."""
+        with self.lock:
+            missing = max(self.min_size - self.size, 0)
+            self.size += missing
+        for _ in range(missing):
+            connection = self.open(connect)
+            with self.lock:
+                if not self.hand_over(connection):
+                    self.idle.append(connection)
+
+    def take(self):
+        """
+        Простаивающее соединение или None с занятым местом под новое.
+        Если мест нет, ожидание в очереди не дольше timeout.
+        """
+        start = time.monotonic()
+        with self.lock:
+            self.acquired += 1
+            if self.idle and not self.waiters:
+                self.in_use += 1
+                return self.idle.pop()
+            if self.size < self.max_size:
+                self.size += 1
+                self.in_use += 1
+                return None
+            waiter = Waiter()
+            self.waiters.append(waiter)
+        served = waiter.event.wait(self.timeout)
+        with self.lock:
+            wait = time.monotonic() - start
+            self.waited += 1
+            self.wait_time += wait
+            self.max_wait = max(self.max_wait, wait)
+            if not served and not waiter.event.is_set():
+                self.waiters.remove(waiter)
+                self.timeouts += 1
+                raise PoolTimeout(
+                    f'Нет свободного соединения за {self.timeout} с.'
+                )
+        return waiter.connection
+
+    def acquire(self, connect, check=None):
+        """
+        Соединение из пула. connect открывает новое, check проверяет
+        простаивавшее (например, SELECT 1) перед выдачей.
+        """
+        if self.size < self.min_size:
+            self.fill(connect)
+        connection = self.take()
+        try:
+            if connection is not None and (
+                    self.expired(connection)
+                    or check is not None and not check(connection)):
+                self.forget(connection)
+                connection = None
+            if connection is None:
+                connection = self.open(connect)
+        except Exception:
+            with self.lock:
+                self.in_use -= 1
+            raise
+        return connection
+
+    def release(self, connection, healthy=True):
+        """Возврат соединения; сломанное или старое закрывается."""
+        if healthy and not self.expired(connection):
+            with self.lock:
+                self.in_use -= 1
+                if not self.hand_over(connection):
+                    self.idle.append(connection)
+            return
+        self.forget(connection)
+        with self.lock:
+            self.in_use -= 1
+        self.free_slot()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.in_use,
+                'waiting': len(self.waiters),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'saturation': self.in_use / self.max_size,
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'wait_ms_total': self.wait_time * 1000,
+                'wait_ms_max': self.max_wait * 1000,
+                'timeouts': self.timeouts,
+                'opened': self.opened,
+                'closed': self.closed,
+            }
+
+
+def get_pool(alias, settings_dict):
+    """Пул соединения alias; None, если в настройках нет POOL."""
+    options = settings_dict.get('POOL')
+    if not options:
+        return None
+    pool = POOLS.get(alias)
+    if pool is None:
+        with POOLS_LOCK:
+            pool = POOLS.get(alias)
+            if pool is None:
+                pool = ConnectionPool(
+                    min_size=options.get('MIN_SIZE', 0),
+                    max_size=options.get('MAX_SIZE', 10),
+                    timeout=options.get('TIMEOUT', 5),
+                    recycle=options.get('RECYCLE', 3600),
+                )
+                POOLS[alias] = pool
+    return pool
+
+
+def get_stats():
+    """Состояние пулов соединений этого процесса."""
+    return {alias: pool.stats() for alias, pool in POOLS.items()}
+
+
+class PooledDatabaseMixin:
+    """
+    Переиспользование соединений для бэкендов Django 3.2.
+
+    CONN_HEALTH_CHECKS: постоянное соединение (CONN_MAX_AGE > 0)
+    проверяется запросом SELECT 1 при первом обращении в каждом
+    HTTP-запросе и переоткрывается, если сервер его закрыл.
+
+    POOL: соединения берутся из пула процесса и возвращаются в него
+    вместо закрытия в конце запроса (CONN_MAX_AGE = 0).
+    """
+    health_check_done = False
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def open_connection(self, conn_params):
+        """Новое физическое соединение с БД."""
+        return super().get_new_connection(conn_params)
+
+    def check_connection(self, connection):
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return self.open_connection(conn_params)
+        try:
+            return pool.acquire(
+                lambda: self.open_connection(conn_params),
+                self.check_connection
+                if self.settings_dict.get('CONN_HEALTH_CHECKS') else None
+            )
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        healthy = True
+        try:
+            self.connection.rollback()
+        except self.Database.Error:
+            healthy = False
+        if healthy and self.errors_occurred:
+            healthy = self.is_usable()
+        pool.release(self.connection, healthy)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.health_check_done
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,89 @@
+import random
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Состояние текущего запроса: реплика для чтения (None — основная БД)
+# и флаг записи. asgiref.local.Local, а не threading.local: в режиме
+# ASGI чтение выполняется в потоках пула, см. api/async_views.py.
+state = Local()
+
+
+@contextmanager
+def use_primary():
+    """
+    Чтение внутри блока идёт в основную БД. Нужно для данных, которые
+    кладутся в кэш под новой версией: отстающая реплика закэшировала бы
+    старое содержимое до следующего изменения.
+    """
+    previous = getattr(state, 'primary', False)
+    state.primary = True
+    try:
+        yield
+    finally:
+        state.primary = previous
+
+
+class ReplicaRouter:
+    """
+    Чтение в безопасных HTTP-запросах идёт в одну из реплик
+    (DATABASE_REPLICAS), запись и всё вне HTTP-запросов — в основную БД.
+    После записи чтение до конца запроса тоже идёт в основную БД, а
+    ReplicaPinMiddleware закрепляет за клиентом основную БД на
+    REPLICA_PIN_SECONDS, чтобы он не увидел свои изменения потерянными.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(state, 'replica', None)
+        if (replica is None
+                or getattr(state, 'primary', False)
+                or model._meta.label_lower in settings.PRIMARY_ONLY_MODELS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        state.replica = None
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной БД, связи между ними допустимы.
+        return True
+
+
+class ReplicaPinMiddleware:
+    """Выбор реплики на запрос и закрепление основной БД после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = settings.DATABASE_REPLICAS
+        pinned = (
+            request.method not in SAFE_METHODS
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        # Одна реплика на весь запрос: у разных реплик разное отставание.
+        state.replica = (
+            random.choice(replicas) if replicas and not pinned else None
+        )
+        state.wrote = False
+        try:
+            response = self.get_response(request)
+            if state.wrote and replicas and settings.REPLICA_PIN_SECONDS:
+                response.set_cookie(
+                    settings.REPLICA_PIN_COOKIE,
+                    '1',
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True,
+                    samesite='Lax',
+                )
+        finally:
+            state.replica = None
+            state.wrote = False
+        return response
@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from foodgram.db.pool import PooledDatabaseMixin
+
+
+class DatabaseWrapper(PooledDatabaseMixin, base.DatabaseWrapper):
+    """SQLite с пулом соединений: для локальной проверки и замеров."""
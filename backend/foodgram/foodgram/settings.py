@@ -31,6 +31,12 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = int(os.getenv('DEBUG'))
 
+# Режим ASGI: горячие маршруты чтения обслуживаются асинхронно,
+# см. api/async_views.py и gunicorn.conf.py.
+ASGI_MODE = bool(int(os.getenv('ASGI_MODE', 0)))
+# Потоки пула, в котором под ASGI выполняется чтение, см. foodgram/asgi.py.
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))
+
 ALLOWED_HOSTS = list(map(str.strip, os.getenv('ALLOWED_HOSTS').split(',')))
 
 
@@ -55,6 +61,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.db.routers.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,14 +94,72 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Бэкенды с пулом соединений и проверкой постоянных соединений,
+# см. foodgram/db/pool.py; без настроек ниже ведут себя как исходные.
+DB_BACKENDS = {
+    'django.db.backends.postgresql': 'foodgram.db.postgresql',
+    'django.db.backends.sqlite3': 'foodgram.db.sqlite3',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE'),
+        'ENGINE': DB_BACKENDS.get(
+            os.getenv('DB_ENGINE'), os.getenv('DB_ENGINE')
+        ),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        # Постоянные соединения: секунды жизни, SELECT 1 в начале запроса.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': bool(int(os.getenv('DB_CONN_HEALTH_CHECKS', 0))),
+        # Пул соединений процесса; включается DB_POOL_MAX_SIZE > 0.
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 0)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 0)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'RECYCLE': int(os.getenv('DB_POOL_RECYCLE', 3600)),
+        } if int(os.getenv('DB_POOL_MAX_SIZE', 0)) else None,
+    }
+}
+
+# Реплики для чтения: хосты через запятую и, если базы называются
+# иначе, их имена (для SQLite — только имена файлов).
+DB_REPLICA_HOSTS = [
+    host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',')
+    if host.strip()
+]
+DB_REPLICA_NAMES = [
+    name.strip() for name in os.getenv('DB_REPLICA_NAMES', '').split(',')
+    if name.strip()
+]
+DATABASE_REPLICAS = []
+for index in range(max(len(DB_REPLICA_HOSTS), len(DB_REPLICA_NAMES))):
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=(DB_REPLICA_HOSTS[index] if index < len(DB_REPLICA_HOSTS)
+              else DATABASES['default']['HOST']),
+        NAME=(DB_REPLICA_NAMES[index] if index < len(DB_REPLICA_NAMES)
+              else DATABASES['default']['NAME']),
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db.routers.ReplicaRouter']
+# Секунды, в течение которых клиент после записи читает из основной БД.
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_COOKIE = 'db_primary'
+# Токен читается сразу после входа: отставание реплики дало бы 401.
+PRIMARY_ONLY_MODELS = ('authtoken.token',)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -119,7 +184,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly'
@@ -169,6 +234,13 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 AUTH_USER_MODEL = 'users.User'
 
+# Кэш токенов авторизации: записей в памяти процесса, секунды жизни
+# записи, общий кэш вторым уровнем. Сброс виден всем процессам сразу
+# через версии токенов в общем кэше.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 60))
+TOKEN_CACHE_SHARED = bool(int(os.getenv('TOKEN_CACHE_SHARED', 0)))
+
 EMAIL_MAX_LENGTH = 254
 USERNAME_MAX_LENGTH = 150
 FIRST_AND_LAST_NAME_MAX_LENGTH = 150
@@ -184,4 +256,32 @@ MIN_COOKING_TIME = 1
 MIN_INGREDIENT_AMOUNT = 1
 LIMIT = 6
 
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+IMAGE_VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+IMAGE_VARIANT_QUALITY = 80
+
+RECIPE_FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+# Полное перестроение индекса ингредиентов рецептов, секунды.
+RECIPE_INDEX_REBUILD_INTERVAL = 60 * 60
+BY_INGREDIENTS_LIMIT = 6
+BY_INGREDIENTS_MAX_LIMIT = 50
+SIMILAR_RECIPES_LIMIT = 10
+# Рецептов в одном запросе к избранному или списку покупок.
+BULK_RECIPES_MAX = 100
+
+# Лента подписок: записей на подписчика и порог подписчиков, выше
+# которого рецепты автора не раскладываются по лентам, а читаются
+# при запросе ленты.
+FEED_MAX_ENTRIES = 1000
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+
+# Конфигурация полнотекстового поиска PostgreSQL.
+SEARCH_CONFIG = 'russian'
+
 EMPTY_VALUE_DISPLAY = '-пусто-'
@@ -0,0 +1,13 @@
+import os
+
+# Общая конфигурация gunicorn для WSGI и ASGI. В режиме ASGI_MODE=1
+# процессы — воркеры uvicorn, а чтение идёт в пуле из ASGI_THREADS
+# потоков; число процессов одинаково, так что и память сравнима.
+bind = '0.0.0.0:8000'
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+
+if int(os.getenv('ASGI_MODE', 0)):
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
@@ -1,28 +1,114 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.urls import reverse
+from django.utils.html import format_html
 
+from api.paginations import ApproximateCountPaginator
 from foodgram.settings import EMPTY_VALUE_DISPLAY
 from recipes.models import (
     Cart, Favorite, Ingredient, IngredientRecipe, Recipe, Tag, TagRecipe
 )
+from recipes.shopping_list import change_recipe_in_shopping_lists
+
+
+def recipes_link(lookup, pk, count):
+    """Ссылка на список рецептов, отфильтрованный по lookup."""
+    url = reverse('admin:recipes_recipe_changelist')
+    return format_html(
+        '<a href="{}?{}={}">Рецептов: {}</a>', url, lookup, pk, count
+    )
+
+
+class LoadedAutocompleteSelect(AutocompleteSelect):
+    """
+    Автодополнение, которое берёт подпись выбранного значения из уже
+    загруженного объекта, а не отдельным запросом на каждую строку.
+    """
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        if self.selected is None or (
+                [str(item) for item in value] != [str(self.selected.pk)]):
+            return super().optgroups(name, value, attr)
+        option = self.create_option(
+            name,
+            self.selected.pk,
+            self.choices.field.label_from_instance(self.selected),
+            True,
+            0,
+        )
+        return [(None, [option], 0)]
+
+
+class LoadedAutocompleteForm(forms.ModelForm):
+    """Передаёт виджетам автодополнения связанные объекты строки."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.instance.pk:
+            return
+        for name, field in self.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            if isinstance(widget, LoadedAutocompleteSelect):
+                widget.selected = getattr(self.instance, name)
+
+
+class LoadedAutocompleteInline(admin.TabularInline):
+    """
+    Строка с автодополнением не делает запрос за подписью: связанные
+    объекты подгружаются в get_queryset по select_related_fields.
+    """
+    form = LoadedAutocompleteForm
+    extra = 1
+    select_related_fields = ()
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            *self.select_related_fields
+        )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.autocomplete_fields:
+            kwargs['widget'] = LoadedAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get('using')
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class TagRecipeInline(admin.TabularInline):
+class TagRecipeInline(LoadedAutocompleteInline):
     model = TagRecipe
-    extra = 1
+    autocomplete_fields = ('tag',)
+    select_related_fields = ('tag', 'recipe')
 
 
-class IngredientRecipeInline(admin.TabularInline):
+class IngredientRecipeInline(LoadedAutocompleteInline):
     model = IngredientRecipe
-    extra = 1
+    autocomplete_fields = ('ingredient',)
+    select_related_fields = ('ingredient', 'recipe')
 
 
 class IngredientAdmin(admin.ModelAdmin):
+    """
+    Рецепты с ингредиентом не выводятся строками формы: для частых
+    ингредиентов это почти вся база. Вместо них — число и ссылка
+    на отфильтрованный список рецептов.
+    """
     list_display = ('name', 'measurement_unit',)
-    search_fields = ('name',)
-    list_filter = ('name',)
+    search_fields = ('^name',)
     ordering = ('name',)
+    readonly_fields = ('used_in',)
     empty_value_display = EMPTY_VALUE_DISPLAY
-    inlines = (IngredientRecipeInline,)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description='Рецепты')
+    def used_in(self, obj):
+        if obj.pk is None:
+            return EMPTY_VALUE_DISPLAY
+        return recipes_link(
+            'ingredients__id__exact', obj.pk, obj.ingredientrecipes.count()
+        )
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -30,35 +116,71 @@ class TagAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     empty_value_display = EMPTY_VALUE_DISPLAY
     ordering = ('name',)
-    inlines = (TagRecipeInline,)
+    readonly_fields = ('used_in',)
+
+    @admin.display(description='Рецепты')
+    def used_in(self, obj):
+        if obj.pk is None:
+            return EMPTY_VALUE_DISPLAY
+        return recipes_link(
+            'tags__id__exact', obj.pk, obj.tag_recipes.count()
+        )
 
 
 class RecipeAdmin(admin.ModelAdmin):
+    """
+    Список рецептов строится за постоянное число запросов: автор
+    подгружается JOIN, теги — одним prefetch, число добавлений
+    в избранное хранится в самом рецепте. Автор и название ищутся
+    поиском, а не фильтром с перечислением всех значений.
+    """
     list_display = ('pk', 'author', 'name', 'get_tags', 'count_favorites')
-    list_filter = ('tags', 'author', 'name')
-    search_fields = ('name', 'author__username', 'author__email', 'tags__name')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username', 'author__email')
     empty_value_display = EMPTY_VALUE_DISPLAY
-    filter_vertical = ('tags',)
-    ordering = ('name',)
+    autocomplete_fields = ('author',)
+    ordering = ('-pub_date', '-id')
     inlines = (TagRecipeInline, IngredientRecipeInline,)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('tags')
+
+    def save_related(self, request, form, formsets, change):
+        """Списки покупок пересчитываются вокруг изменения ингредиентов."""
+        if change:
+            change_recipe_in_shopping_lists(form.instance.pk, -1)
+        super().save_related(request, form, formsets, change)
+        if change:
+            change_recipe_in_shopping_lists(form.instance.pk, 1)
 
+    @admin.display(description='В избранном')
     def count_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
+    @admin.display(description='Теги')
     def get_tags(self, obj):
         return ', '.join(tag.name for tag in obj.tags.all())
 
 
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'user',)
+    list_select_related = ('recipe', 'user')
     search_fields = ('recipe__name', 'user__username', 'user__email')
+    autocomplete_fields = ('recipe', 'user')
     empty_value_display = EMPTY_VALUE_DISPLAY
+    show_full_result_count = False
 
 
 class CartAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'user',)
+    list_select_related = ('recipe', 'user')
     search_fields = ('user__username', 'user__email')
+    autocomplete_fields = ('recipe', 'user')
     empty_value_display = EMPTY_VALUE_DISPLAY
+    show_full_result_count = False
 
 
 admin.site.register(Ingredient, IngredientAdmin)
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        import recipes.signals  # noqa: F401
+        from recipes.indexes import check_shared_cache
+        from recipes.search import create_fts_table
+
+        check_shared_cache()
+        post_migrate.connect(create_fts_table, sender=self)
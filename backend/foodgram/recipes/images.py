@@ -0,0 +1,42 @@
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from foodgram.settings import (
+    IMAGE_VARIANT_FORMATS,
+    IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANTS
+)
+
+VARIANTS_DIR = 'recipes/variants'
+
+
+def make_variants(image_name):
+    """
+    Уменьшенные копии изображения рецепта во всех форматах.
+    Возвращает словарь {вариант: {формат: путь в хранилище}}.
+    """
+    with default_storage.open(image_name) as file:
+        with Image.open(file) as original:
+            original = original.convert('RGB')
+    stem = PurePosixPath(image_name).stem
+    variants = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        variants[variant] = {}
+        for extension, image_format in IMAGE_VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            image.save(
+                buffer, image_format, quality=IMAGE_VARIANT_QUALITY
+            )
+            name = f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[variant][extension] = default_storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+    return variants
@@ -0,0 +1,380 @@
+import time
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import islice
+from threading import Lock
+from uuid import uuid4
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from foodgram.db.routers import use_primary
+from foodgram.settings import RECIPE_INDEX_REBUILD_INTERVAL
+
+INGREDIENTS_VERSION_KEY = 'recipes:ingredients:version'
+TAGS_VERSION_KEY = 'recipes:tags:version'
+# Кэши, содержимое которых не видно другим процессам.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def normalize(value):
+    """Приведение названия к виду для поиска без учёта регистра."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+def check_shared_cache():
+    """
+    Версии данных хранятся в кэше по умолчанию, и их смена должна быть
+    видна всем процессам: воркерам, import_csv, process_images. Кэш
+    процесса допустим только в режиме отладки с одним процессом.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if not settings.DEBUG and backend in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f'CACHE_BACKEND {backend} не общий для процессов: '
+            'укажите, например, PyMemcacheCache.'
+        )
+
+
+def get_version(key):
+    """Текущая версия данных; создаётся при первом обращении."""
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    """
+    Новая версия данных: процессы перестроят свои копии при следующем
+    обращении, см. check_shared_cache.
+    """
+    cache.set(key, uuid4().hex, None)
+
+
+class VersionedIndex:
+    """
+    Данные в памяти процесса, перестраиваемые при смене версии
+    (version_key) после изменения исходной таблицы.
+    """
+    version_key = None
+
+    def __init__(self):
+        self.data = self.empty()
+        self.version = None
+        self.lock = Lock()
+
+    def empty(self):
+        raise NotImplementedError
+
+    def build(self):
+        raise NotImplementedError
+
+    def refresh(self):
+        """Перестроение индекса, если данные изменились."""
+        version = get_version(self.version_key)
+        if version == self.version:
+            return
+        # Отстающая реплика сохранила бы старые данные под новой версией.
+        with self.lock, use_primary():
+            if version != self.version:
+                self.build()
+                self.version = version
+
+
+class IngredientIndex(VersionedIndex):
+    """
+    Префиксный индекс ингредиентов в памяти процесса.
+    Отсортированный массив нормализованных названий: поиск по префиксу
+    выполняется бинарным поиском без обращения к БД.
+    """
+    version_key = INGREDIENTS_VERSION_KEY
+
+    def empty(self):
+        return ([], [])
+
+    def build(self):
+        from recipes.models import Ingredient
+
+        entries = sorted(
+            (normalize(name), name, measurement_unit, pk)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        self.data = (
+            [key for key, *_ in entries],
+            [
+                {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+                for _, name, measurement_unit, pk in entries
+            ],
+        )
+
+    def search(self, query, limit=None):
+        """
+        Ингредиенты, название которых начинается с query.
+        Точные совпадения идут первыми: в отсортированном массиве
+        строка предшествует всем своим продолжениям.
+        """
+        self.refresh()
+        query = normalize(query)
+        keys, items = self.data
+        result = []
+        position = bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            result.append(items[position])
+            if limit is not None and len(result) >= limit:
+                break
+            position += 1
+        return result
+
+
+class TagIndex(VersionedIndex):
+    """Соответствие slug тега его id для проверки фильтра без запроса."""
+    version_key = TAGS_VERSION_KEY
+
+    def empty(self):
+        return {}
+
+    def build(self):
+        from recipes.models import Tag
+
+        self.data = dict(Tag.objects.values_list('slug', 'pk'))
+
+    def choices(self):
+        self.refresh()
+        return [(slug, slug) for slug in self.data]
+
+    def ids(self, slugs):
+        self.refresh()
+        return [self.data[slug] for slug in slugs if slug in self.data]
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс ингредиент → рецепты в памяти процесса.
+
+    Рецепты хранятся отсортированным массивом id, их ингредиенты —
+    в формате CSR (indptr, indices). Для каждого ингредиента хранится
+    отсортированный массив позиций рецептов, так что покрытие набора
+    ингредиентов считается одним np.bincount.
+
+    Рецепты, изменённые после построения, подгружаются по полю updated
+    и хранятся отдельно (overlay) до следующего полного построения.
+    Удаление ингредиента каскадом удаляет строки IngredientRecipe, не
+    трогая updated рецептов, поэтому смена версии ингредиентов тоже
+    ведёт к полному построению.
+    """
+    # Повторно просматриваемый интервал: часы серверов могут расходиться,
+    # а транзакция фиксируется позже, чем выставлено updated.
+    CHANGE_MARGIN = timedelta(seconds=5)
+    OVERLAY_LIMIT = 10000
+    BUILD_CHUNK = 100000
+
+    def __init__(self):
+        self.data = None
+        self.overlay = {}
+        self.checked = None
+        self.built = 0
+        self.version = None
+        self.lock = Lock()
+        # Полное построение одно на процесс, см. refresh.
+        self.build_lock = Lock()
+
+    def prepare(self, recipes, ingredients):
+        """
+        Массивы индекса из двух массивов одинаковой длины: id рецепта
+        и id ингредиента для каждой строки IngredientRecipe.
+        """
+        order = np.lexsort((ingredients, recipes))
+        recipes = recipes[order]
+        ingredients = ingredients[order].astype(np.int64)
+        recipe_ids, starts, sizes = np.unique(
+            recipes, return_index=True, return_counts=True
+        )
+        indptr = np.append(starts, len(recipes))
+        positions = np.repeat(
+            np.arange(len(recipe_ids), dtype=np.int32), sizes
+        )
+        by_ingredient = np.argsort(ingredients, kind='stable')
+        ingredient_ids, posting_starts = np.unique(
+            ingredients[by_ingredient], return_index=True
+        )
+        return {
+            'recipe_ids': recipe_ids.astype(np.int64),
+            'sizes': sizes.astype(np.int32),
+            'indptr': indptr,
+            'indices': ingredients,
+            'ingredient_ids': ingredient_ids,
+            'posting_ptr': np.append(posting_starts, len(ingredients)),
+            'postings': positions[by_ingredient],
+        }
+
+    def load(self, recipes, ingredients):
+        """Построение из готовых массивов, см. prepare."""
+        self.data = self.prepare(recipes, ingredients)
+        self.overlay = {}
+
+    def build(self):
+        """
+        Полное построение. Чтение и подготовка массивов идут без
+        блокировки, под ней новые данные только подменяют старые.
+        """
+        from recipes.models import IngredientRecipe
+
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        checked = timezone.now() - self.CHANGE_MARGIN
+        chunks = []
+        # Изменения, ещё не дошедшие до реплики, были бы пропущены:
+        # checked уже позже них.
+        with use_primary():
+            rows = IngredientRecipe.objects.order_by().values_list(
+                'recipe_id', 'ingredient_id'
+            ).iterator(chunk_size=self.BUILD_CHUNK)
+            while True:
+                chunk = list(islice(rows, self.BUILD_CHUNK))
+                if not chunk:
+                    break
+                chunks.append(np.array(chunk, dtype=np.int64))
+        pairs = (np.concatenate(chunks) if chunks
+                 else np.empty((0, 2), dtype=np.int64))
+        data = self.prepare(pairs[:, 0], pairs[:, 1])
+        with self.lock:
+            self.data = data
+            self.overlay = {}
+            self.checked = checked
+            self.built = time.monotonic()
+            self.version = version
+
+    def stale(self, version):
+        """Нужно ли полное построение."""
+        return (
+            self.data is None
+            or version != self.version
+            or len(self.overlay) > self.OVERLAY_LIMIT
+            or time.monotonic() - self.built > RECIPE_INDEX_REBUILD_INTERVAL
+        )
+
+    def refresh(self):
+        """Полное построение или подгрузка изменённых рецептов."""
+        from recipes.models import IngredientRecipe, Recipe
+
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        # Пока один поток строит индекс заново, остальные отвечают по
+        # старым данным с подгрузкой изменений; ждут построения только
+        # запросы к ещё не построенному индексу.
+        if self.stale(version) and self.build_lock.acquire(
+                blocking=self.data is None):
+            try:
+                if self.stale(version):
+                    self.build()
+                    return
+            finally:
+                self.build_lock.release()
+        with self.lock, use_primary():
+            checked = timezone.now() - self.CHANGE_MARGIN
+            changed = list(Recipe.objects.filter(
+                updated__gte=self.checked
+            ).values_list('pk', flat=True))
+            self.checked = checked
+            if not changed:
+                return
+            overlay = dict(self.overlay)
+            overlay.update({pk: [] for pk in changed})
+            for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+                recipe__in=changed
+            ).values_list('recipe_id', 'ingredient_id'):
+                overlay[recipe_id].append(ingredient_id)
+            self.overlay = {
+                pk: np.array(sorted(ingredients), dtype=np.int64)
+                for pk, ingredients in overlay.items()
+            }
+
+    def positions(self, recipe_ids):
+        """Позиции рецептов из основного массива."""
+        ids = self.data['recipe_ids']
+        found = np.searchsorted(ids, recipe_ids)
+        found = found[found < len(ids)]
+        return found[np.isin(ids[found], recipe_ids)]
+
+    def ingredients_of(self, position):
+        data = self.data
+        return data['indices'][
+            data['indptr'][position]:data['indptr'][position + 1]
+        ]
+
+    def rank(self, have, limit):
+        """
+        Рецепты, в которых есть хотя бы один ингредиент из have, по
+        убыванию доли имеющихся ингредиентов, затем по числу недостающих.
+        Возвращает список (id рецепта, число совпадений, недостающие id).
+        """
+        self.refresh()
+        data, overlay = self.data, self.overlay
+        have = np.unique(np.asarray(have, dtype=np.int64))
+        ingredient_ids = data['ingredient_ids']
+        found = np.searchsorted(
+            ingredient_ids, have[np.isin(have, ingredient_ids)]
+        )
+        posting_ptr = data['posting_ptr']
+        postings = [
+            data['postings'][posting_ptr[index]:posting_ptr[index + 1]]
+            for index in found
+        ]
+        counts = np.bincount(
+            np.concatenate(postings) if postings
+            else np.empty(0, dtype=np.int32),
+            minlength=len(data['recipe_ids']),
+        )
+        if overlay:
+            counts[self.positions(np.fromiter(overlay, dtype=np.int64))] = 0
+        candidates = np.flatnonzero(counts)
+        coverage = counts[candidates] / data['sizes'][candidates]
+        if len(candidates) > limit:
+            # Полная сортировка нужна только рецептам с покрытием
+            # не ниже limit-го по величине.
+            threshold = np.partition(coverage, -limit)[-limit]
+            candidates = candidates[coverage >= threshold]
+            coverage = coverage[coverage >= threshold]
+        matched = counts[candidates]
+        sizes = data['sizes'][candidates]
+        order = np.lexsort((
+            -data['recipe_ids'][candidates],
+            sizes - matched,
+            -coverage,
+        ))[:limit]
+        ranked = [
+            (
+                int(data['recipe_ids'][candidates[index]]),
+                int(matched[index]),
+                int(sizes[index]),
+                self.ingredients_of(candidates[index]),
+            )
+            for index in order
+        ]
+        for recipe_id, ingredients in overlay.items():
+            count = int(np.isin(ingredients, have).sum())
+            if count:
+                ranked.append(
+                    (recipe_id, count, len(ingredients), ingredients)
+                )
+        ranked.sort(key=lambda item: (
+            -item[1] / item[2], item[2] - item[1], -item[0]
+        ))
+        return [
+            (recipe_id, count, ingredients[~np.isin(ingredients, have)])
+            for recipe_id, count, _, ingredients in ranked[:limit]
+        ]
+
+
+ingredient_index = IngredientIndex()
+tag_index = TagIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,91 @@
+from collections import Counter, defaultdict
+
+from django.db import connections, router, transaction
+
+from recipes.models import Cart, Recipe
+from recipes.shopping_list import change_shopping_list
+from recipes.signals import RECIPE_CHANGED, RECIPE_COUNTERS, change_counter
+
+
+def add_recipes(model, user, recipe_ids):
+    """
+    Добавление рецептов в избранное или список покупок одним
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING: повторное или
+    одновременное добавление не приводит к ошибке, несуществующие
+    рецепты пропускаются. Возвращает id добавленных рецептов.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return []
+    table = model._meta.db_table
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, recipe_id) '
+                f'SELECT %s, id FROM {Recipe._meta.db_table} '
+                f'WHERE id IN ({placeholders}) '
+                f'ON CONFLICT DO NOTHING RETURNING recipe_id',
+                (user.pk, *recipe_ids)
+            )
+            added = [row[0] for row in cursor.fetchall()]
+        if added:
+            change_counter(
+                Recipe, added, RECIPE_COUNTERS[model], 1,
+                RECIPE_CHANGED.get(model)
+            )
+            if model is Cart:
+                change_shopping_list(user.pk, added, 1)
+    return added
+
+
+def remove_recipes(model, user, recipe_ids):
+    """
+    Удаление рецептов из избранного или списка покупок одним
+    DELETE ... WHERE recipe_id IN. Возвращает id удалённых рецептов.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return []
+    table = model._meta.db_table
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} '
+                f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+                f'RETURNING recipe_id',
+                (user.pk, *recipe_ids)
+            )
+            removed = [row[0] for row in cursor.fetchall()]
+        if removed:
+            change_counter(
+                Recipe, removed, RECIPE_COUNTERS[model], -1,
+                RECIPE_CHANGED.get(model)
+            )
+            if model is Cart:
+                change_shopping_list(user.pk, removed, -1)
+    return removed
+
+
+def forget_removed(model, pairs):
+    """
+    Счётчики рецептов и списки покупок для записей (user_id, recipe_id),
+    удаляемых через ORM: по одному UPDATE на каждое число удалённых
+    записей рецепта и по одному вычитанию на пользователя.
+    """
+    removed = Counter(recipe_id for _, recipe_id in pairs)
+    for count in set(removed.values()):
+        change_counter(
+            Recipe,
+            [pk for pk, total in removed.items() if total == count],
+            RECIPE_COUNTERS[model], -count, RECIPE_CHANGED.get(model)
+        )
+    if model is Cart:
+        by_user = defaultdict(list)
+        for user_id, recipe_id in pairs:
+            by_user[user_id].append(recipe_id)
+        for user_id, recipe_ids in by_user.items():
+            change_shopping_list(user_id, recipe_ids, -1)
@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+
+from recipes.indexes import RecipeIngredientIndex
+from recipes.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = '''Замер подбора рецептов по имеющимся ингредиентам.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--have', type=int, default=8,
+                            help='Число ингредиентов в запросе.')
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            metavar='RECIPES',
+            help='Индекс из случайных рецептов без обращения к БД.',
+        )
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='Размер каталога для --synthetic.')
+        parser.add_argument('--per-recipe', type=int, default=10,
+                            help='Ингредиентов в рецепте для --synthetic.')
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        index = RecipeIngredientIndex()
+        if options['synthetic']:
+            ingredient_ids = list(range(1, options['ingredients'] + 1))
+            elapsed = self.load_synthetic(index, options)
+        else:
+            ingredient_ids = list(
+                Ingredient.objects.values_list('pk', flat=True)
+            )
+            if not ingredient_ids:
+                raise CommandError('Каталог ингредиентов пуст.')
+            start = time.perf_counter()
+            index.build()
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Построение: {elapsed:.2f} с, '
+            f'рецептов {len(index.data["recipe_ids"])}, '
+            f'строк {len(index.data["indices"])}'
+        )
+        # Перестроение и опрос изменений не входят в замер.
+        index.refresh = lambda: None
+        queries = [
+            generator.sample(
+                ingredient_ids, min(options['have'], len(ingredient_ids))
+            )
+            for _ in range(options['queries'])
+        ]
+        limit = options['limit']
+        self.report('index', queries, lambda have: index.rank(have, limit))
+        if not options['synthetic']:
+            self.report('orm', queries, lambda have: list(
+                Recipe.objects.annotate(
+                    matched=Count(
+                        'ingredientrecipes',
+                        filter=Q(ingredientrecipes__ingredient__in=have)
+                    ),
+                    total=Count('ingredientrecipes'),
+                ).filter(matched__gt=0).order_by(
+                    '-matched', 'total', '-id'
+                ).values_list('pk', flat=True)[:limit]
+            ))
+
+    def load_synthetic(self, index, options):
+        """Случайные рецепты: популярные ингредиенты встречаются чаще."""
+        rng = np.random.default_rng(options['seed'])
+        recipes = options['synthetic']
+        per_recipe = options['per_recipe']
+        weights = 1 / np.arange(1, options['ingredients'] + 1)
+        ingredients = rng.choice(
+            np.arange(1, options['ingredients'] + 1),
+            size=recipes * per_recipe,
+            p=weights / weights.sum(),
+        )
+        recipe_ids = np.repeat(np.arange(1, recipes + 1), per_recipe)
+        # Повторы ингредиента в рецепте убираются по составному ключу.
+        base = options['ingredients'] + 1
+        keys = np.unique(recipe_ids * base + ingredients)
+        start = time.perf_counter()
+        index.load(keys // base, keys % base)
+        return time.perf_counter() - start
+
+    def report(self, label, queries, rank):
+        timings = []
+        for have in queries:
+            start = time.perf_counter()
+            rank(have)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'{label}: среднее {statistics.mean(timings):.3f} мс, '
+            f'p50 {timings[len(timings) // 2]:.3f} мс, '
+            f'p99 {timings[int(len(timings) * 0.99)]:.3f} мс'
+        )
@@ -0,0 +1,51 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.indexes import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = '''Сравнение поиска ингредиентов по индексу в памяти и через ORM.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=None)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('Каталог ингредиентов пуст.')
+        generator = random.Random(options['seed'])
+        prefixes = []
+        for _ in range(options['queries']):
+            name = generator.choice(names)
+            prefixes.append(name[:generator.randint(1, min(len(name), 4))])
+        limit = options['limit']
+
+        ingredient_index.refresh()
+        self.report('index', prefixes, lambda prefix: (
+            ingredient_index.search(prefix, limit)
+        ))
+        self.report('orm', prefixes, lambda prefix: list(
+            Ingredient.objects.filter(name__istartswith=prefix).values(
+                'id', 'name', 'measurement_unit'
+            )[:limit]
+        ))
+
+    def report(self, label, prefixes, search):
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            search(prefix)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'{label}: среднее {statistics.mean(timings):.3f} мс, '
+            f'p50 {timings[len(timings) // 2]:.3f} мс, '
+            f'p99 {timings[int(len(timings) * 0.99)]:.3f} мс'
+        )
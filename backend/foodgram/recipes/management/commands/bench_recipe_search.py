@@ -0,0 +1,57 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from recipes.models import Recipe
+from recipes.search import search
+
+
+class Command(BaseCommand):
+    help = '''Сравнение полнотекстового поиска рецептов с icontains.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(
+            Recipe.objects.order_by('?').values_list('name', flat=True)[:1000]
+        )
+        if not names:
+            raise CommandError('Рецептов нет.')
+        generator = random.Random(options['seed'])
+        words = [
+            generator.choice(generator.choice(names).split() or ['?'])
+            for _ in range(options['queries'])
+        ]
+        limit = options['limit']
+        self.stdout.write(f'Рецептов: {Recipe.objects.count()}')
+
+        self.report('search', words, lambda word: list(
+            search(Recipe.objects.all(), word)
+            .order_by('-search_rank', '-pub_date', '-id')
+            .values_list('pk', flat=True)[:limit]
+        ))
+        self.report('icontains', words, lambda word: list(
+            Recipe.objects.filter(
+                Q(name__icontains=word) | Q(text__icontains=word)
+                | Q(ingredients__name__icontains=word)
+            ).distinct().values_list('pk', flat=True)[:limit]
+        ))
+
+    def report(self, label, words, query):
+        timings = []
+        for word in words:
+            start = time.perf_counter()
+            query(word)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'{label}: среднее {statistics.mean(timings):.3f} мс, '
+            f'p50 {timings[len(timings) // 2]:.3f} мс, '
+            f'p99 {timings[int(len(timings) * 0.99)]:.3f} мс'
+        )
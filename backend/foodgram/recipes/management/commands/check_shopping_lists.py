@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientRecipe, ShoppingListItem
+from recipes.shopping_list import rebuild_shopping_lists
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = '''Сверка списков покупок с суммой ингредиентов рецептов из Cart.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Пересобрать расходящиеся списки.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        checked = 0
+        broken = []
+        last_pk = 0
+        while True:
+            pks = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            mismatched = self.check_batch(pks)
+            if mismatched and options['fix']:
+                with transaction.atomic():
+                    rebuild_shopping_lists(mismatched)
+            broken.extend(mismatched)
+            checked += len(pks)
+            last_pk = pks[-1]
+        self.stdout.write(f'Проверено пользователей: {checked}')
+        if not broken:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        users = ', '.join(map(str, broken[:20]))
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересобрано списков: {len(broken)} ({users})'
+            ))
+            return
+        raise CommandError(
+            f'Списки покупок расходятся с Cart: {len(broken)} ({users})'
+        )
+
+    def check_batch(self, pks):
+        """Пользователи пачки, чей список отличается от расчёта по JOIN."""
+        expected = {}
+        for user, ingredient, total in IngredientRecipe.objects.filter(
+            recipe__carts__user__in=pks
+        ).values_list('recipe__carts__user', 'ingredient').annotate(
+            total=Sum('amount')
+        ).order_by().iterator():
+            expected.setdefault(user, {})[ingredient] = total
+        actual = {}
+        for user, ingredient, amount in ShoppingListItem.objects.filter(
+            user__in=pks
+        ).values_list('user', 'ingredient', 'amount').iterator():
+            actual.setdefault(user, {})[ingredient] = amount
+        return sorted(
+            pk for pk in expected.keys() | actual.keys()
+            if expected.get(pk) != actual.get(pk)
+        )
@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from foodgram.settings import SIMILAR_RECIPES_LIMIT
+from recipes.models import Favorite, Recipe, SimilarRecipe
+from recipes.similarity import FavoriteMatrix, load_favorites
+
+
+class Command(BaseCommand):
+    help = '''Расчёт похожих рецептов по совместному добавлению в избранное.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=SIMILAR_RECIPES_LIMIT)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Только рецепты, избранное которых изменилось '
+                 'после прошлого расчёта.',
+        )
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1 or options['chunk_size'] < 1:
+            raise CommandError(
+                '--top-k и --chunk-size должны быть больше нуля.'
+            )
+        # Изменения избранного во время расчёта попадут в следующий запуск.
+        started = timezone.now()
+        start = time.perf_counter()
+        recipes = Recipe.objects.all()
+        if options['incremental']:
+            recipes = recipes.filter(
+                Q(similar_computed__isnull=True)
+                | Q(favorites_changed__gt=F('similar_computed'))
+            )
+            matrix = None
+        else:
+            matrix = self.load_matrix(Favorite.objects.all())
+        total = rows = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                recipes.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not pks:
+                break
+            rows += self.save_chunk(
+                matrix if matrix is not None else self.load_related(pks),
+                pks, options['top_k'], started
+            )
+            total += len(pks)
+            last_pk = pks[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {total}, записано пар: {rows} '
+            f'за {time.perf_counter() - start:.2f} с.'
+        ))
+
+    def load_matrix(self, favorites, full_degrees=None):
+        start = time.perf_counter()
+        matrix = FavoriteMatrix(load_favorites(favorites), full_degrees)
+        self.stdout.write(
+            f'Избранное загружено за {time.perf_counter() - start:.2f} с: '
+            f'рецептов {len(matrix.recipe_ids)}, '
+            f'строк {len(matrix.recipe_users)}'
+        )
+        return matrix
+
+    def load_related(self, pks):
+        """
+        Часть избранного, достаточная для пачки pks: всё избранное
+        пользователей, добавивших эти рецепты, и полное число добавлений
+        их соседей для норм.
+        """
+        favorites = Favorite.objects.filter(
+            user__in=Favorite.objects.filter(recipe__in=pks).values('user')
+        )
+        full_degrees = np.array(
+            Favorite.objects.filter(recipe__in=favorites.values('recipe'))
+            .values('recipe_id').annotate(count=Count('pk'))
+            .order_by('recipe_id').values_list('recipe_id', 'count'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        return self.load_matrix(favorites, full_degrees)
+
+    @transaction.atomic
+    def save_chunk(self, matrix, pks, top_k, started):
+        """Замена похожих рецептов для пачки одной транзакцией."""
+        similar = [
+            SimilarRecipe(recipe_id=pk, similar_id=similar_id, score=score)
+            for pk in pks
+            for similar_id, score in matrix.similar(pk, top_k)
+        ]
+        SimilarRecipe.objects.filter(recipe__in=pks).delete()
+        SimilarRecipe.objects.bulk_create(similar, batch_size=5000)
+        Recipe.objects.filter(pk__in=pks).update(similar_computed=started)
+        return len(similar)
@@ -1,19 +1,133 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
+from recipes.indexes import INGREDIENTS_VERSION_KEY, bump_version
 from recipes.models import Ingredient
 
+DEFAULT_PATH = settings.BASE_DIR / 'data' / 'ingredients.csv'
+FORMATS = ('csv', 'json', 'ndjson')
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            item = json.loads(line)
+            yield item['name'], item['measurement_unit']
+
+
+def read_json(file):
+    """Потоковое чтение JSON-массива объектов без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: file.read(READ_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and buffer[position:position + 1] == '[':
+                started = True
+                position += 1
+                continue
+            if buffer[position:position + 1] in ('', ']'):
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                break
+            yield item['name'], item['measurement_unit']
+        buffer = buffer[position:]
+    if buffer.strip() not in ('', ']'):
+        raise CommandError('Некорректный JSON в конце файла.')
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'ndjson': read_ndjson}
+
 
 class Command(BaseCommand):
-    help = '''Загрузка информации из csv-файла в базу данных.'''
+    help = '''Загрузка ингредиентов из csv, json или ndjson в базу данных.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только подсчитать новые и уже загруженные записи.',
+        )
 
     def handle(self, *args, **options):
-        with open('data/ingredients.csv', encoding='utf-8') as file:
-            file_reader = csv.reader(file)
-            for row in file_reader:
-                name, measurement_unit = row
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit
-                )
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат {file_format!r}, '
+                f'укажите --format: {", ".join(FORMATS)}.'
+            )
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+
+        start = time.perf_counter()
+        total = inserted = 0
+        with open(path, encoding='utf-8') as file:
+            rows = READERS[file_format](file)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                total += len(batch)
+                inserted += self.count_new(batch)
+                if not options['dry_run']:
+                    self.insert(batch)
+        elapsed = time.perf_counter() - start
+
+        if inserted and not options['dry_run']:
+            bump_version(INGREDIENTS_VERSION_KEY)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверено" if options["dry_run"] else "Загружено"} '
+            f'{total} строк за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с): '
+            f'новых {inserted}, пропущено {total - inserted}.'
+        ))
+
+    def count_new(self, batch):
+        """Число строк пачки, которых ещё нет в базе."""
+        keys = set(batch)
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in keys}
+        ).values_list('name', 'measurement_unit'))
+        return len(keys - existing)
+
+    def insert(self, batch):
+        """
+        Вставка пачки одним запросом; дубликаты по
+        unique_ingredient_measurement_unit пропускаются базой.
+        """
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in batch
+            ),
+            batch_size=len(batch),
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.images import make_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = '''Фоновая обработка изображений рецептов: уменьшенные копии.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = self.process_batch(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано изображений: {processed}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
+
+    @transaction.atomic
+    def process_batch(self, batch_size):
+        """
+        Пачка рецептов без уменьшенных копий по частичному индексу
+        image_pending. Блокировка с SKIP LOCKED позволяет запускать
+        несколько обработчиков параллельно.
+        """
+        recipes = list(
+            Recipe.objects.filter(image_pending=True).order_by('pk')
+            .select_for_update(skip_locked=True)
+            .only('pk', 'image')[:batch_size]
+        )
+        for recipe in recipes:
+            variants = {}
+            try:
+                if recipe.image:
+                    variants = make_variants(recipe.image.name)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+                variants = {'error': str(error)}
+            Recipe.objects.filter(
+                pk=recipe.pk, image=recipe.image.name
+            ).update(
+                image_variants=variants,
+                image_pending=False,
+                updated=timezone.now(),
+            )
+        return len(recipes)
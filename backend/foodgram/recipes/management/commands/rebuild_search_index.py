@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+from recipes.search import create_fts_table, update_search_index
+
+
+class Command(BaseCommand):
+    help = '''Пересчёт поисковых данных всех рецептов.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        create_fts_table()
+        total = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                Recipe.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            update_search_index(pks)
+            total += len(pks)
+            last_pk = pks[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковые данные пересчитаны: {total} рецептов.'
+        ))
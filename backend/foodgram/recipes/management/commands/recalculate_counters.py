@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Follow, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', Cart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = '''Сверка денормализованных счётчиков с фактическими данными.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        for model, field, source, relation in COUNTERS:
+            fixed = 0
+            last_pk = 0
+            while True:
+                pks = list(
+                    model.objects.filter(pk__gt=last_pk).order_by('pk')
+                    .values_list('pk', flat=True)[:options['batch_size']]
+                )
+                if not pks:
+                    break
+                fixed += self.reconcile(model, field, source, relation, pks)
+                last_pk = pks[-1]
+            self.stdout.write(
+                f'{model.__name__}.{field}: исправлено {fixed}'
+            )
+
+    @transaction.atomic
+    def reconcile(self, model, field, source, relation, pks):
+        """
+        Пачка строк блокируется на время подсчёта, чтобы параллельные
+        изменения счётчика не потерялись при записи.
+        """
+        objects = list(
+            model.objects.filter(pk__in=pks).select_for_update()
+            .only('pk', field)
+        )
+        actual = dict(
+            source.objects.filter(**{f'{relation}__in': pks})
+            .order_by().values(relation).annotate(total=Count('pk'))
+            .values_list(relation, 'total')
+        )
+        drifted = []
+        for obj in objects:
+            value = actual.get(obj.pk, 0)
+            if getattr(obj, field) != value:
+                setattr(obj, field, value)
+                drifted.append(obj)
+        model.objects.bulk_update(drifted, (field,))
+        return len(drifted)
@@ -0,0 +1,598 @@
+import io
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from PIL import Image
+
+from recipes.images import make_variants
+from recipes.indexes import TAGS_VERSION_KEY, bump_version
+from recipes.management.commands.recalculate_counters import COUNTERS
+from recipes.models import (
+    Cart, Favorite, FeedEntry, Ingredient, IngredientRecipe, Recipe,
+    ShoppingListItem, Tag, TagRecipe
+)
+from recipes.search import create_fts_table, update_search_index
+from recipes.shopping_list import rebuild_shopping_lists
+from recipes.timelines import rebuild as rebuild_feeds
+from users.models import Follow, User
+
+# Строк на единицу --scale: --scale 100 — 100 тысяч пользователей,
+# миллион рецептов и 10 миллионов записей избранного.
+SCALE = {
+    'users': 1000,
+    'recipes': 10000,
+    'follows': 20000,
+    'favorites': 100000,
+    'carts': 3000,
+}
+AUTHORS_SHARE = 0.2
+CART_USERS_SHARE = 0.3
+# Выбор по популярности: первому проценту авторов (рецептов,
+# ингредиентов) достаётся 0.01 ** (1 / POWER) ≈ 22% подписок.
+POWER = 3
+INGREDIENTS_PER_RECIPE = (3, 8, 15)
+TAGS_PER_RECIPE = (1, 3)
+COOKING_TIME = (5, 180)
+AMOUNT = (1, 500)
+PUB_DAYS = 365
+SAMPLE_ROUNDS = 20
+# Пачка id для пересчётов с IN (...): предел параметров SQLite.
+IDS_CHUNK = 900
+# Память на пересоздание индексов после загрузки в PostgreSQL.
+MAINTENANCE_WORK_MEM = '256MB'
+
+# Таблицы, которые команда заполняет через COPY и затем пересобирает.
+LOADED = (User, Recipe, IngredientRecipe, TagRecipe, Follow, Favorite, Cart)
+REBUILT = (ShoppingListItem, FeedEntry)
+
+PASSWORD = 'bench-password'
+PLACEHOLDER = 'recipes/bench_placeholder.jpg'
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2A7C3', 'dessert'),
+    ('Выпечка', '#C9A14A', 'bakery'),
+)
+DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Каша', 'Рагу', 'Запеканка', 'Омлет',
+    'Паста', 'Плов', 'Котлеты', 'Блины', 'Соус',
+)
+
+
+def popular(rng, size, count):
+    """Позиции от 0 до count - 1; малые выпадают по степенному закону."""
+    return (rng.random(size) ** POWER * count).astype(np.int64)
+
+
+def sample_pairs(rng, owners, mean, targets, exclude_self=False):
+    """
+    Уникальные пары (владелец, цель): у владельца в среднем mean целей
+    (геометрическое распределение), цели выбираются по популярности,
+    порядок популярности задаёт порядок targets. Повторы выбрасываются
+    и добираются заново, пока у владельцев не наберётся нужное число.
+    """
+    owners = np.sort(owners)
+    sizes = np.minimum(
+        rng.geometric(min(1 / mean, 1), len(owners)),
+        len(targets) - int(exclude_self)
+    )
+    pairs = np.empty((0, 2), dtype=np.int64)
+    missing = sizes
+    for _ in range(SAMPLE_ROUNDS):
+        column = np.repeat(owners, missing)
+        if not len(column):
+            break
+        pairs = np.unique(np.concatenate((pairs, np.stack(
+            (column, targets[popular(rng, len(column), len(targets))]),
+            axis=1
+        ))), axis=0)
+        if exclude_self:
+            pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        missing = sizes - np.bincount(
+            np.searchsorted(owners, pairs[:, 0]), minlength=len(owners)
+        )
+    return pairs
+
+
+def chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def copy_value(value):
+    """Поле CSV для COPY: NULL без кавычек, пустая строка — в кавычках."""
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+@contextmanager
+def keep_dates(model):
+    """bulk_create без подстановки текущего времени в auto_now-поля."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def droppable(cursor, tables, indexes):
+    """
+    Внешние ключи таблиц tables, а при indexes и ограничения уникальности
+    с индексами, кроме первичного ключа, — с определениями для пересоздания.
+    """
+    cursor.execute(
+        'SELECT conrelid::regclass::text, conname, '
+        'pg_get_constraintdef(oid) FROM pg_constraint '
+        'WHERE conrelid = ANY(%s::regclass[]) '
+        'AND contype = ANY(%s) ORDER BY contype DESC',
+        (tables, ['f', 'u'] if indexes else ['f'])
+    )
+    constraints = cursor.fetchall()
+    if not indexes:
+        return constraints, []
+    cursor.execute(
+        'SELECT indexrelid::regclass::text, '
+        'pg_get_indexdef(indexrelid) FROM pg_index '
+        'WHERE indrelid = ANY(%s::regclass[]) '
+        'AND indexrelid NOT IN ('
+        "SELECT conindid FROM pg_constraint WHERE contype IN "
+        "('p', 'u'))",
+        (tables,)
+    )
+    return constraints, cursor.fetchall()
+
+
+@contextmanager
+def bulk_load(*models, indexes=True):
+    """
+    Блок загрузки в одной транзакции. В PostgreSQL внешние ключи таблиц
+    models, а при indexes и их индексы и ограничения уникальности, кроме
+    первичного ключа, удаляются и создаются после блока заново: одна
+    проверка и одна сортировка на таблицу вместо поддержки на каждую
+    строку. После пересоздания набор ограничений и индексов сверяется
+    с исходным; расхождение — ошибка. После блока собирается статистика:
+    без неё планировщик не знает о новых строках до прихода autovacuum.
+    При ошибке удаление откатывается вместе с данными.
+    """
+    connection = connections[router.db_for_write(models[0])]
+    with transaction.atomic(using=connection.alias):
+        if connection.vendor != 'postgresql':
+            yield
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SET LOCAL maintenance_work_mem = '{MAINTENANCE_WORK_MEM}'"
+            )
+            tables = [model._meta.db_table for model in models]
+            constraints, created = droppable(cursor, tables, indexes)
+            for table, name, _ in constraints:
+                cursor.execute(
+                    f'ALTER TABLE {table} '
+                    f'DROP CONSTRAINT {connection.ops.quote_name(name)}'
+                )
+            for index, _ in created:
+                cursor.execute(f'DROP INDEX {index}')
+        yield
+        with connection.cursor() as cursor:
+            for _, sql in created:
+                cursor.execute(sql)
+            for table, name, definition in constraints:
+                cursor.execute(
+                    f'ALTER TABLE {table} ADD CONSTRAINT '
+                    f'{connection.ops.quote_name(name)} {definition}'
+                )
+            restored, recreated = droppable(cursor, tables, indexes)
+            missing = sorted(
+                f'{table}.{name}'
+                for table, name, _ in set(constraints) - set(restored)
+            ) + sorted(
+                index for index, _ in set(created) - set(recreated)
+            )
+            if missing:
+                raise CommandError(
+                    'После загрузки не восстановлены: '
+                    f'{", ".join(missing)}.'
+                )
+            cursor.execute('ANALYZE ' + ', '.join(
+                connection.ops.quote_name(table) for table in tables
+            ))
+
+
+def copy(connection, model, columns, buffer):
+    """COPY строк CSV из buffer в колонки columns таблицы модели."""
+    buffer.seek(0)
+    columns = ', '.join(map(connection.ops.quote_name, columns))
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+            f'({columns}) FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+
+
+def insert(model, objects):
+    """
+    Вставка пачки без сигналов: COPY в PostgreSQL, иначе bulk_create.
+    Первичный ключ передаётся, только если он задан у объектов.
+    """
+    if not objects:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'postgresql':
+        with keep_dates(model):
+            model.objects.bulk_create(objects, batch_size=len(objects))
+        return len(objects)
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key or objects[0].pk is not None
+    ]
+    buffer = io.StringIO()
+    for obj in objects:
+        buffer.write(','.join(
+            copy_value(field.get_db_prep_save(
+                getattr(obj, field.attname), connection
+            ))
+            for field in fields
+        ))
+        buffer.write('\n')
+    copy(connection, model, [field.column for field in fields], buffer)
+    return len(objects)
+
+
+def insert_rows(model, names, rows):
+    """
+    Вставка целочисленного массива rows в поля names. В PostgreSQL
+    массив пишется в COPY напрямую, без объектов моделей: на таблицах
+    связей с десятками миллионов строк их создание дороже самой вставки.
+    """
+    if not len(rows):
+        return 0
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'postgresql':
+        return insert(model, [
+            model(**dict(zip(names, row))) for row in rows.tolist()
+        ])
+    buffer = io.StringIO()
+    np.savetxt(buffer, rows, fmt='%d', delimiter=',')
+    copy(connection, model, [
+        model._meta.get_field(name).column for name in names
+    ], buffer)
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = '''Синтетические данные для замеров производительности.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1,
+            help='Множитель объёма: 1 — 10 тысяч рецептов, '
+                 '100 — миллион.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        for name in SCALE:
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                help=f'Число строк вместо {SCALE[name]} × --scale.',
+            )
+        parser.add_argument(
+            '--i-know-this-drops-constraints',
+            action='store_true',
+            dest='force',
+            help='Запуск без DEBUG: на время загрузки удаляются внешние '
+                 'ключи, ограничения уникальности и индексы таблиц.',
+        )
+
+    def handle(self, *args, **options):
+        if not (settings.DEBUG or options['force']):
+            database = connections[router.db_for_write(Recipe)]
+            raise CommandError(
+                'Команда пишет синтетические данные и на время загрузки '
+                'удаляет внешние ключи, ограничения уникальности и индексы '
+                f'таблиц БД {database.settings_dict["NAME"]}. Без DEBUG '
+                'запуск только с --i-know-this-drops-constraints.'
+            )
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        sizes = {
+            name: options[name] if options[name] is not None
+            else int(base * options['scale'])
+            for name, base in SCALE.items()
+        }
+        if sizes['users'] < 1 or sizes['recipes'] < 1:
+            raise CommandError('Нужны хотя бы один пользователь и рецепт.')
+        if min(sizes.values()) < 0:
+            raise CommandError('Число строк не может быть отрицательным.')
+        ingredients = dict(Ingredient.objects.values_list('pk', 'name'))
+        if not ingredients:
+            raise CommandError(
+                'Ингредиентов нет: сначала python manage.py import_csv.'
+            )
+        self.rng = np.random.default_rng(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        start = time.perf_counter()
+
+        with bulk_load(*LOADED):
+            users = self.create_users(sizes['users'])
+            authors = self.rng.permutation(users)[
+                :max(int(len(users) * AUTHORS_SHARE), 1)
+            ]
+            recipes = self.create_recipes(
+                sizes['recipes'], authors, ingredients, self.get_tags()
+            )
+            popular_recipes = self.rng.permutation(recipes)
+            followers = self.create_pairs(
+                'Подписки', Follow, 'user_id', 'author_id',
+                users, sizes['follows'], self.rng.permutation(authors),
+                exclude_self=True,
+            )
+            self.create_pairs(
+                'Избранное', Favorite, 'user_id', 'recipe_id',
+                users, sizes['favorites'], popular_recipes,
+            )
+            cart_users = self.rng.permutation(users)[
+                :max(int(len(users) * CART_USERS_SHARE), 1)
+            ]
+            cart_users = self.create_pairs(
+                'Списки покупок', Cart, 'user_id', 'recipe_id',
+                cart_users, sizes['carts'], popular_recipes,
+            )
+            restore = time.perf_counter()
+        self.stdout.write(
+            f'Индексы и внешние ключи: '
+            f'{time.perf_counter() - restore:.1f} с'
+        )
+        self.rebuild(users, recipes, followers, cart_users)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - start:.1f} с, '
+            f'seed {options["seed"]}, пароль пользователей {PASSWORD!r}.'
+        ))
+
+    def report(self, label, count, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label}: {count} за {elapsed:.1f} с '
+            f'({count / elapsed if elapsed else count:.0f} строк/с)'
+        )
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def create_users(self, count):
+        start = time.perf_counter()
+        first = self.next_pk(User)
+        password = make_password(PASSWORD)
+        ids = np.arange(first, first + count, dtype=np.int64)
+        for batch in chunks(ids, self.batch_size):
+            joined = self.rng.random(len(batch)) * PUB_DAYS
+            insert(User, [
+                User(
+                    pk=pk,
+                    username=f'bench{pk}',
+                    email=f'bench{pk}@bench.foodgram.ru',
+                    first_name='Пользователь',
+                    last_name=str(pk),
+                    password=password,
+                    date_joined=self.now - timedelta(days=days),
+                )
+                for pk, days in zip(batch.tolist(), joined.tolist())
+            ])
+        self.report('Пользователи', count, start)
+        return ids
+
+    def get_tags(self):
+        """id тегов; если тегов нет, создаются стандартные."""
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        if tags:
+            return np.array(tags, dtype=np.int64)
+        Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in DEFAULT_TAGS
+        )
+        bump_version(TAGS_VERSION_KEY)
+        return np.array(
+            Tag.objects.values_list('pk', flat=True), dtype=np.int64
+        )
+
+    def create_placeholder(self):
+        """Одно крошечное изображение и его копии на все рецепты."""
+        if not default_storage.exists(PLACEHOLDER):
+            buffer = io.BytesIO()
+            Image.new('RGB', (16, 16), (226, 108, 45)).save(buffer, 'JPEG')
+            default_storage.save(PLACEHOLDER, ContentFile(buffer.getvalue()))
+        return make_variants(PLACEHOLDER)
+
+    def create_recipes(self, count, authors, ingredients, tags):
+        start = time.perf_counter()
+        variants = self.create_placeholder()
+        first = self.next_pk(Recipe)
+        ids = np.arange(first, first + count, dtype=np.int64)
+        popular_ingredients = self.rng.permutation(
+            np.array(list(ingredients), dtype=np.int64)
+        )
+        low, mean, high = INGREDIENTS_PER_RECIPE
+        rows = 0
+        for batch in chunks(ids, self.batch_size):
+            column = np.repeat(
+                batch, np.clip(self.rng.poisson(mean, len(batch)), low, high)
+            )
+            amounts = np.unique(np.stack((
+                column,
+                popular_ingredients[popular(
+                    self.rng, len(column), len(popular_ingredients)
+                )],
+            ), axis=1), axis=0)
+            column = np.repeat(batch, self.rng.integers(
+                TAGS_PER_RECIPE[0], TAGS_PER_RECIPE[1] + 1, len(batch)
+            ))
+            recipe_tags = np.unique(np.stack((
+                column, tags[self.rng.integers(0, len(tags), len(column))]
+            ), axis=1), axis=0)
+            insert(Recipe, self.build_recipes(
+                batch, authors, amounts, ingredients, variants
+            ))
+            insert_rows(
+                IngredientRecipe, ('recipe_id', 'ingredient_id', 'amount'),
+                np.column_stack((amounts, self.rng.integers(
+                    AMOUNT[0], AMOUNT[1] + 1, len(amounts)
+                ))),
+            )
+            insert_rows(TagRecipe, ('recipe_id', 'tag_id'), recipe_tags)
+            rows += len(amounts) + len(recipe_tags)
+        self.report('Рецепты', count, start)
+        self.stdout.write(f'  ингредиенты и теги рецептов: {rows}')
+        return ids
+
+    def build_recipes(self, batch, authors, amounts, ingredients, variants):
+        """
+        Рецепты пачки. Название и текст собираются из ингредиентов, чтобы
+        поиск работал на правдоподобных словах.
+        """
+        recipe_ids, starts, sizes = np.unique(
+            amounts[:, 0], return_index=True, return_counts=True
+        )
+        names = {
+            recipe: [ingredients[pk] for pk in amounts[
+                start:start + size, 1
+            ].tolist()]
+            for recipe, start, size in zip(
+                recipe_ids.tolist(), starts.tolist(), sizes.tolist()
+            )
+        }
+        author_ids = authors[popular(self.rng, len(batch), len(authors))]
+        dishes = self.rng.integers(0, len(DISHES), len(batch))
+        cooking_times = self.rng.integers(
+            COOKING_TIME[0], COOKING_TIME[1] + 1, len(batch)
+        )
+        ages = self.rng.random(len(batch)) * PUB_DAYS
+        recipes = []
+        for pk, author, dish, cooking_time, days in zip(
+            batch.tolist(), author_ids.tolist(), dishes.tolist(),
+            cooking_times.tolist(), ages.tolist()
+        ):
+            parts = names[pk]
+            name = f'{DISHES[dish]} с {parts[0].lower()}'
+            recipes.append(Recipe(
+                pk=pk,
+                author_id=author,
+                name=name[:Recipe._meta.get_field('name').max_length],
+                image=PLACEHOLDER,
+                image_variants=variants,
+                image_pending=False,
+                text=(
+                    f'{name}. Понадобится: {", ".join(parts)}. '
+                    f'Готовить {cooking_time} минут.'
+                ),
+                cooking_time=cooking_time,
+                pub_date=self.now - timedelta(days=days),
+                updated=self.now,
+            ))
+        return recipes
+
+    def create_pairs(self, label, model, owner_field, target_field,
+                     owners, count, targets, exclude_self=False):
+        """Строки связи пачками владельцев; возвращает владельцев с ними."""
+        start = time.perf_counter()
+        if not count or not len(targets):
+            self.report(label, 0, start)
+            return np.array([], dtype=np.int64)
+        mean = count / len(owners)
+        rows = 0
+        used = []
+        for batch in chunks(owners, max(int(self.batch_size / mean), 1)):
+            pairs = sample_pairs(self.rng, batch, mean, targets, exclude_self)
+            rows += insert_rows(model, (owner_field, target_field), pairs)
+            used.append(np.unique(pairs[:, 0]))
+        self.report(label, rows, start)
+        return np.concatenate(used)
+
+    def rebuild(self, users, recipes, followers, cart_users):
+        """
+        Данные, которые обычно поддерживают сигналы: счётчики новых
+        пользователей и рецептов, поиск, списки покупок и ленты подписок.
+        """
+        start = time.perf_counter()
+        connection = connections[router.db_for_write(Recipe)]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), (User, Recipe)
+            ):
+                cursor.execute(sql)
+        counters = {}
+        for model, field, source, relation in COUNTERS:
+            counters.setdefault(model, {})[field] = Coalesce(Subquery(
+                source.objects.filter(**{relation: OuterRef('pk')})
+                .order_by().values(relation).annotate(total=Count('pk'))
+                .values('total')
+            ), 0)
+        # Счётчики модели одним UPDATE: каждый UPDATE пишет новую версию
+        # всех строк, и с UPDATE на счётчик таблицы раздувались бы вдвое.
+        User.objects.filter(pk__range=(users[0], users[-1])).update(
+            **counters[User]
+        )
+        # У PostgreSQL нет предела параметров SQLite: пачки крупнее, а ленты
+        # собираются одним запросом — без индексов лент, удалённых на время
+        # загрузки, каждая пачка просматривала бы всю таблицу.
+        postgresql = connection.vendor == 'postgresql'
+        size = self.batch_size if postgresql else IDS_CHUNK
+        create_fts_table()
+        with bulk_load(Recipe):
+            Recipe.objects.filter(
+                pk__range=(recipes[0], recipes[-1])
+            ).update(**counters[Recipe])
+            for batch in chunks(recipes, size):
+                update_search_index(batch.tolist())
+        self.report('Счётчики и поисковые данные', len(recipes), start)
+        start = time.perf_counter()
+        with bulk_load(ShoppingListItem, indexes=False):
+            for batch in chunks(cart_users, size):
+                rebuild_shopping_lists(batch.tolist())
+        self.report('Списки покупок пересобраны', len(cart_users), start)
+        start = time.perf_counter()
+        with bulk_load(FeedEntry):
+            for batch in chunks(
+                followers, max(len(followers), 1) if postgresql else size
+            ):
+                rebuild_feeds(batch.tolist())
+        self.report('Ленты подписок пересобраны', len(followers), start)
+        if postgresql:
+            # Статистика планировщика и карта видимости сразу, а не когда
+            # до новых таблиц дойдёт autovacuum посреди замеров.
+            start = time.perf_counter()
+            tables = ', '.join(
+                connection.ops.quote_name(model._meta.db_table)
+                for model in LOADED + REBUILT
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f'VACUUM ANALYZE {tables}')
+            self.stdout.write(
+                f'VACUUM ANALYZE: {time.perf_counter() - start:.1f} с'
+            )
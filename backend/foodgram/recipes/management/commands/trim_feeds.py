@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.settings import FEED_MAX_ENTRIES
+from recipes.timelines import trim
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = '''Обрезка лент подписок до FEED_MAX_ENTRIES записей.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=FEED_MAX_ENTRIES)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять обрезку через столько секунд; '
+                 'без параметра — один проход.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['limit'] < 1:
+            raise CommandError(
+                '--batch-size и --limit должны быть больше нуля.'
+            )
+        while True:
+            deleted = self.trim_all(options['batch_size'], options['limit'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Удалено записей: {deleted}')
+            )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def trim_all(self, batch_size, limit):
+        """
+        Проход по всем лентам. Публикация рецепта добавляет запись в ленты
+        подписчиков без обрезки: на авторе с тысячами подписчиков это
+        стоило бы оконного запроса по всем их лентам в запросе на запись.
+        """
+        deleted = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                User.objects.filter(pk__gt=last_pk, feed_entries__isnull=False)
+                .order_by('pk').distinct()
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                return deleted
+            deleted += trim(pks, limit)
+            last_pk = pks[-1]
@@ -1,8 +1,19 @@
 from colorfield.fields import ColorField
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import UniqueConstraint
+from django.db import models, router, transaction
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Q,
+    UniqueConstraint,
+    Window
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
+from foodgram.db.models import DenormalizedFieldsMixin
 from foodgram.settings import (
     TAG_NAME_MAX_LENGTH,
     TAG_SLUG_MAX_LENGTH,
@@ -12,7 +23,8 @@ from foodgram.settings import (
     MIN_COOKING_TIME,
     MIN_INGREDIENT_AMOUNT
 )
-from users.models import User
+from recipes.search import SearchVectorField, SearchVectorIndex
+from users.models import Follow, User
 
 
 class Ingredient(models.Model):
@@ -66,8 +78,86 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов."""
+
+    def with_related(self, user):
+        """
+        Рецепты со связанными данными за фиксированное число запросов.
+        Признаки избранного, корзины и подписки вычисляются в SQL.
+        """
+        authors = User.objects.all()
+        queryset = self.prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientrecipes',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=Exists(
+                    Follow.objects.filter(user=user, author=OuterRef('pk'))
+                )
+            )
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+            )
+        return queryset.prefetch_related(Prefetch('author', queryset=authors))
+
+    def with_flags(self, user):
+        """
+        Рецепты с автором и признаками для пользователя одним запросом.
+        Остальные данные рецепта берутся из кэша фрагментов.
+        """
+        queryset = self.select_related('author')
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            author_is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('author'))
+            ),
+        )
+
+    def first_per_author(self, authors, limit):
+        """
+        Не больше limit последних рецептов каждого автора.
+        Нумерация внутри автора — ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+        if not authors:
+            # Пустой IN () не компилируется в SQL: EmptyResultSet.
+            return self.none()
+        ranked = Recipe.objects.filter(author__in=authors).order_by().annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT "id" FROM ({sql}) AS "ranked" WHERE "row_number" <= %s',
+            (*params, limit)
+        )).order_by('-pub_date', '-id')
+
+
+class Recipe(DenormalizedFieldsMixin, models.Model):
     """Модель рецептов."""
+    DENORMALIZED_FIELDS = (
+        'favorites_count', 'carts_count', 'favorites_changed',
+        'similar_computed', 'search_vector',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -82,6 +172,17 @@ class Recipe(models.Model):
         upload_to='recipes/',
         verbose_name='Изображение',
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+    )
+    image_pending = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Изображение ждёт обработки',
+    )
     text = models.TextField(
         verbose_name='Текстовое описание',
     )
@@ -112,9 +213,61 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    carts_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+    favorites_changed = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Изменение избранного',
+    )
+    similar_computed = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Расчёт похожих рецептов',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_id_idx'
+            ),
+            models.Index(fields=('updated',), name='recipe_updated_idx'),
+            # Очередь process_images: в индексе только необработанные.
+            models.Index(
+                fields=('id',),
+                condition=Q(image_pending=True),
+                name='recipe_image_pending_idx'
+            ),
+            SearchVectorIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx'
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -176,6 +329,12 @@ class TagRecipe(models.Model):
     )
 
     class Meta:
+        indexes = (
+            models.Index(
+                fields=('recipe', 'tag'),
+                name='tagrecipe_recipe_tag_idx'
+            ),
+        )
         verbose_name = 'Рецепты с тегами'
         verbose_name_plural = 'Рецепты с тегами'
 
@@ -183,7 +342,38 @@ class TagRecipe(models.Model):
         return f'{self.tag.name} для рецепта {self.recipe.name}'
 
 
-class Favorite(models.Model):
+class RecipeListQuerySet(models.QuerySet):
+    """
+    Избранное и список покупок. У моделей нет сигналов удаления, чтобы
+    каскад от рецепта или пользователя удалял записи одним DELETE без
+    загрузки строк (счётчики и списки покупок тогда правит
+    recipes.signals). Удаление через ORM, например в админке, правит
+    их здесь.
+    """
+
+    def delete(self):
+        from recipes.lists import forget_removed
+
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            forget_removed(
+                self.model, list(self.values_list('user_id', 'recipe_id'))
+            )
+            return super().delete()
+
+
+class RecipeListEntry(models.Model):
+    """Удаление записи идёт через RecipeListQuerySet.delete."""
+
+    objects = RecipeListQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, using=None, keep_parents=False):
+        return type(self).objects.filter(pk=self.pk).delete()
+
+
+class Favorite(RecipeListEntry):
     """Модель избранных рецептов."""
     user = models.ForeignKey(
         User,
@@ -211,7 +401,7 @@ class Favorite(models.Model):
         return f'{self.recipe.name} в избранном у {self.user.username}'
 
 
-class Cart(models.Model):
+class Cart(RecipeListEntry):
     """Модель списка покупок."""
     user = models.ForeignKey(
         User,
@@ -237,3 +427,116 @@ class Cart(models.Model):
 
     def __str__(self):
         return f'{self.recipe.name} в списке у {self.user.username}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Ингредиент в списке покупок пользователя: сумма количеств по всем
+    рецептам из Cart. Поддерживается при изменении Cart и ингредиентов
+    рецептов, см. recipes.shopping_list.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='shopping_list_item_unique'
+            ),
+        )
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+
+    def __str__(self):
+        return f'{self.ingredient.name} в списке у {self.user.username}'
+
+
+class SimilarRecipe(models.Model):
+    """Похожий рецепт по совместному добавлению в избранное."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'), name='similar_recipe_unique'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx'
+            ),
+        )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.similar_id} похож на {self.recipe_id}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт автора в ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='feed_entry_unique'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_entry_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'), name='feed_entry_user_author_idx'
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+    def __str__(self):
+        return f'{self.recipe_id} в ленте {self.user_id}'
@@ -0,0 +1,164 @@
+import re
+
+from django.db import connections, models
+from django.db.models import F, Lookup, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+
+from foodgram.settings import SEARCH_CONFIG
+
+# Веса частей рецепта: название, ингредиенты, описание.
+WEIGHTS = {'name': 'A', 'ingredients': 'B', 'text': 'C'}
+FTS_TABLE = 'recipes_recipe_fts'
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+class SearchVectorField(models.Field):
+    """
+    Поисковый вектор рецепта: tsvector в PostgreSQL.
+    На других СУБД колонка не заполняется, поиск идёт через FTS5.
+    """
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+        return 'text'
+
+
+@SearchVectorField.register_lookup
+class SearchMatch(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} @@ {rhs}', (*lhs_params, *rhs_params)
+
+
+class SearchVectorIndex(models.Index):
+    """GIN-индекс в PostgreSQL, обычный индекс на других СУБД."""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            using = ' USING gin'
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+
+def create_fts_table(using='default', **kwargs):
+    """Таблица FTS5 для SQLite; вызывается после migrate."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f'name, ingredients, text, '
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def update_search_index(recipe_ids, using='default'):
+    """Пересчёт поисковых данных рецептов после изменения."""
+    from recipes.models import Ingredient, IngredientRecipe, Recipe
+
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.aggregates import StringAgg
+        from django.contrib.postgres.search import SearchVector
+
+        ingredients = (
+            IngredientRecipe.objects.filter(recipe=OuterRef('pk'))
+            .order_by().values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        Recipe.objects.using(using).filter(pk__in=recipe_ids).update(
+            search_vector=(
+                SearchVector('name', weight=WEIGHTS['name'],
+                             config=SEARCH_CONFIG)
+                + SearchVector(Subquery(ingredients),
+                               weight=WEIGHTS['ingredients'],
+                               config=SEARCH_CONFIG)
+                + SearchVector('text', weight=WEIGHTS['text'],
+                               config=SEARCH_CONFIG)
+            )
+        )
+        return
+    if connection.vendor != 'sqlite':
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            f'SELECT recipe.id, recipe.name, COALESCE(('
+            f'SELECT group_concat(ingredient.name, \' \') '
+            f'FROM {IngredientRecipe._meta.db_table} AS amount '
+            f'JOIN {Ingredient._meta.db_table} AS ingredient '
+            f'ON ingredient.id = amount.ingredient_id '
+            f'WHERE amount.recipe_id = recipe.id), \'\'), recipe.text '
+            f'FROM {Recipe._meta.db_table} AS recipe '
+            f'WHERE recipe.id IN ({placeholders})',
+            recipe_ids
+        )
+
+
+def remove_from_search_index(recipe_ids, using='default'):
+    """Удаление рецептов из FTS5; в PostgreSQL вектор удаляется со строкой."""
+    connection = connections[using]
+    recipe_ids = list(recipe_ids)
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids
+        )
+
+
+def fts_query(text):
+    """
+    Запрос FTS5 из пользовательского текста: слова в кавычках
+    с поиском по началу слова вместо стемминга.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def search(queryset, text):
+    """
+    Рецепты, подходящие под text, с рангом search_rank:
+    выше ранжируются совпадения в названии, затем в ингредиентах.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector__match=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+    if connection.vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+            return queryset.none()
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        table = queryset.model._meta.db_table
+        return queryset.annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            (query,),
+            output_field=models.FloatField(),
+        )).filter(search_rank__isnull=False)
+    words = re.findall(r'\w+', text)
+    for word in words:
+        queryset = queryset.filter(name__icontains=word)
+    return queryset.annotate(search_rank=models.Value(
+        0.0, output_field=models.FloatField()
+    ))
@@ -0,0 +1,110 @@
+from django.db import connections, router
+
+from recipes.models import Cart, IngredientRecipe, ShoppingListItem
+
+TABLE = ShoppingListItem._meta.db_table
+CART_TABLE = Cart._meta.db_table
+AMOUNTS_TABLE = IngredientRecipe._meta.db_table
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def execute(sql, params):
+    using = router.db_for_write(ShoppingListItem)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def upsert(select, params):
+    """
+    Прибавление количеств из select (user_id, ingredient_id, amount)
+    к списку покупок одним INSERT ... ON CONFLICT DO UPDATE.
+    """
+    execute(
+        f'INSERT INTO {TABLE} (user_id, ingredient_id, amount) {select} '
+        f'ON CONFLICT (user_id, ingredient_id) '
+        f'DO UPDATE SET amount = {TABLE}.amount + excluded.amount',
+        params
+    )
+
+
+def change_shopping_list(user_id, recipe_ids, sign):
+    """
+    Добавление (sign=1) или вычитание (sign=-1) ингредиентов рецептов
+    в списке покупок пользователя. Вызывается в транзакции записи Cart
+    только для действительно добавленных или удалённых рецептов.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    upsert(
+        f'SELECT %s, ingredient_id, SUM(amount) * %s FROM {AMOUNTS_TABLE} '
+        f'WHERE recipe_id IN ({placeholders(recipe_ids)}) '
+        f'GROUP BY ingredient_id',
+        (user_id, sign, *recipe_ids)
+    )
+    if sign < 0:
+        execute(
+            f'DELETE FROM {TABLE} WHERE user_id = %s AND amount <= 0',
+            (user_id,)
+        )
+
+
+def change_recipe_in_shopping_lists(recipe_id, sign):
+    """
+    Добавление или вычитание ингредиентов рецепта в списках покупок
+    всех пользователей, у которых он в Cart. При изменении ингредиентов
+    вызывается с -1 до изменения и с 1 после.
+    """
+    upsert(
+        f'SELECT cart.user_id, amount.ingredient_id, '
+        f'SUM(amount.amount) * %s '
+        f'FROM {CART_TABLE} AS cart '
+        f'JOIN {AMOUNTS_TABLE} AS amount '
+        f'ON amount.recipe_id = cart.recipe_id '
+        f'WHERE cart.recipe_id = %s '
+        f'GROUP BY cart.user_id, amount.ingredient_id',
+        (sign, recipe_id)
+    )
+    if sign > 0:
+        execute(
+            f'DELETE FROM {TABLE} WHERE amount <= 0 AND user_id IN ('
+            f'SELECT user_id FROM {CART_TABLE} WHERE recipe_id = %s)',
+            (recipe_id,)
+        )
+
+
+def remove_recipe_from_shopping_lists(recipe_id):
+    """
+    Вычитание ингредиентов удаляемого рецепта из списков покупок всех
+    пользователей, у которых он в Cart: два запроса на рецепт, а не на
+    каждую запись Cart.
+    """
+    change_recipe_in_shopping_lists(recipe_id, -1)
+    execute(
+        f'DELETE FROM {TABLE} WHERE amount <= 0 AND user_id IN ('
+        f'SELECT user_id FROM {CART_TABLE} WHERE recipe_id = %s)',
+        (recipe_id,)
+    )
+
+
+def rebuild_shopping_lists(user_ids):
+    """Пересборка списков покупок пользователей по Cart."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    execute(
+        f'DELETE FROM {TABLE} WHERE user_id IN ({placeholders(user_ids)})',
+        user_ids
+    )
+    upsert(
+        f'SELECT cart.user_id, amount.ingredient_id, SUM(amount.amount) '
+        f'FROM {CART_TABLE} AS cart '
+        f'JOIN {AMOUNTS_TABLE} AS amount '
+        f'ON amount.recipe_id = cart.recipe_id '
+        f'WHERE cart.user_id IN ({placeholders(user_ids)}) '
+        f'GROUP BY cart.user_id, amount.ingredient_id',
+        user_ids
+    )
@@ -0,0 +1,137 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.indexes import (
+    INGREDIENTS_VERSION_KEY,
+    TAGS_VERSION_KEY,
+    bump_version
+)
+from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
+from recipes.search import remove_from_search_index, update_search_index
+from recipes.shopping_list import (
+    change_shopping_list,
+    remove_recipe_from_shopping_lists
+)
+from users.models import User
+
+RECIPE_COUNTERS = {Favorite: 'favorites_count', Cart: 'carts_count'}
+# Отметка для пересчёта похожих рецептов пишется тем же UPDATE.
+RECIPE_CHANGED = {Favorite: 'favorites_changed'}
+
+
+def change_counter(model, pks, field, delta, changed=None):
+    """Изменение счётчика в той же транзакции, что и запись."""
+    fields = {field: F(field) + delta}
+    if changed:
+        fields[changed] = timezone.now()
+    model.objects.filter(pk__in=pks).update(**fields)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    """Сброс версии ингредиентов после фиксации изменений каталога."""
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION_KEY))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    """Сброс версии тегов после фиксации изменений."""
+    transaction.on_commit(lambda: bump_version(TAGS_VERSION_KEY))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Cart)
+def recipe_added(sender, instance, created, **kwargs):
+    """Рецепт добавлен в избранное или список покупок."""
+    if created:
+        change_counter(
+            Recipe, (instance.recipe_id,), RECIPE_COUNTERS[sender], 1,
+            RECIPE_CHANGED.get(sender)
+        )
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=Cart)
+def recipe_list_changed(sender, instance, **kwargs):
+    """
+    Запись избранного или Cart изменена, например в админке: старый
+    рецепт вычитается, новый прибавляется.
+    """
+    if instance.pk is None:
+        return
+    old = sender.objects.filter(pk=instance.pk).values(
+        'user_id', 'recipe_id'
+    ).first()
+    if not old or (old['user_id'], old['recipe_id']) == (
+            instance.user_id, instance.recipe_id):
+        return
+    if old['recipe_id'] != instance.recipe_id:
+        for recipe_id, delta in (
+                (old['recipe_id'], -1), (instance.recipe_id, 1)):
+            change_counter(
+                Recipe, (recipe_id,), RECIPE_COUNTERS[sender], delta,
+                RECIPE_CHANGED.get(sender)
+            )
+    if sender is Cart:
+        change_shopping_list(old['user_id'], (old['recipe_id'],), -1)
+        change_shopping_list(instance.user_id, (instance.recipe_id,), 1)
+
+
+@receiver(post_save, sender=Cart)
+def cart_added(instance, created, **kwargs):
+    """Ингредиенты рецепта прибавляются к списку покупок."""
+    if created:
+        change_shopping_list(instance.user_id, (instance.recipe_id,), 1)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(instance, **kwargs):
+    """
+    Избранное и корзина пользователя удаляются каскадом одним DELETE,
+    до него счётчики их рецептов уменьшаются одним UPDATE на модель.
+    Список покупок пользователя удаляется каскадом вместе с ним.
+    """
+    for model, field in RECIPE_COUNTERS.items():
+        change_counter(
+            Recipe,
+            model.objects.filter(user=instance.pk).values('recipe_id'),
+            field, -1, RECIPE_CHANGED.get(model)
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(instance, **kwargs):
+    """
+    Записи Cart рецепта удаляются каскадом одним DELETE, до него
+    ингредиенты рецепта ещё на месте и вычитаются из списков покупок.
+    Счётчики рецепта удаляются вместе с ним.
+    """
+    remove_recipe_from_shopping_lists(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, using, **kwargs):
+    """
+    Новый рецепт автора. Поисковые данные пересчитываются после
+    фиксации: к этому моменту сохранены и ингредиенты рецепта.
+    """
+    if created:
+        change_counter(User, (instance.author_id,), 'recipes_count', 1)
+    transaction.on_commit(
+        lambda: update_search_index((instance.pk,), using), using
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, using, **kwargs):
+    """Удалён рецепт автора."""
+    change_counter(User, (instance.author_id,), 'recipes_count', -1)
+    remove_from_search_index((instance.pk,), using)
@@ -0,0 +1,86 @@
+from itertools import islice
+
+import numpy as np
+
+LOAD_CHUNK = 100000
+
+
+def load_favorites(queryset):
+    """
+    Строки избранного (user_id, recipe_id) потоком в массив NumPy:
+    в памяти нет списка объектов на всю таблицу.
+    """
+    rows = queryset.order_by().values_list('user_id', 'recipe_id').iterator(
+        chunk_size=LOAD_CHUNK
+    )
+    chunks = []
+    while True:
+        chunk = list(islice(rows, LOAD_CHUNK))
+        if not chunk:
+            break
+        chunks.append(np.array(chunk, dtype=np.int64))
+    if not chunks:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def concat_ranges(values, starts, ends):
+    """values[starts[0]:ends[0]] + values[starts[1]:ends[1]] + ..."""
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return values[np.arange(lengths.sum()) + offsets]
+
+
+class FavoriteMatrix:
+    """
+    Разреженная матрица пользователь × рецепт в двух формах CSR:
+    рецепты каждого пользователя и пользователи каждого рецепта.
+    Сходство рецептов — косинус их векторов пользователей.
+
+    Если загружена только часть избранного, full_degrees — строки
+    (recipe_id, число добавлений) по всей таблице, отсортированные по id:
+    нормы векторов считаются по ним.
+    """
+
+    def __init__(self, pairs, full_degrees=None):
+        self.recipe_ids, recipes = np.unique(pairs[:, 1], return_inverse=True)
+        _, users = np.unique(pairs[:, 0], return_inverse=True)
+        by_user = np.argsort(users, kind='stable')
+        self.user_recipes = recipes[by_user]
+        self.user_ptr = np.searchsorted(
+            users[by_user], np.arange(users.max() + 2 if len(users) else 1)
+        )
+        by_recipe = np.argsort(recipes, kind='stable')
+        self.recipe_users = users[by_recipe]
+        degrees = np.bincount(recipes, minlength=len(self.recipe_ids))
+        self.recipe_ptr = np.append(0, np.cumsum(degrees))
+        if full_degrees is not None:
+            degrees = full_degrees[:, 1][
+                np.searchsorted(full_degrees[:, 0], self.recipe_ids)
+            ]
+        self.norms = np.sqrt(degrees)
+
+    def similar(self, recipe_id, limit):
+        """Не более limit пар (id похожего рецепта, сходство)."""
+        position = np.searchsorted(self.recipe_ids, recipe_id)
+        if (position == len(self.recipe_ids)
+                or self.recipe_ids[position] != recipe_id):
+            return []
+        users = self.recipe_users[
+            self.recipe_ptr[position]:self.recipe_ptr[position + 1]
+        ]
+        neighbors = concat_ranges(
+            self.user_recipes, self.user_ptr[users], self.user_ptr[users + 1]
+        )
+        neighbors, common = np.unique(neighbors, return_counts=True)
+        keep = neighbors != position
+        neighbors, common = neighbors[keep], common[keep]
+        scores = common / (self.norms[position] * self.norms[neighbors])
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            neighbors, scores = neighbors[top], scores[top]
+        order = np.lexsort((self.recipe_ids[neighbors], -scores))
+        return [
+            (int(self.recipe_ids[neighbors[index]]), float(scores[index]))
+            for index in order
+        ]
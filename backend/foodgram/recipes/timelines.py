@@ -0,0 +1,142 @@
+from django.db import connections, router
+from django.db.models import F, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from api.paginations import keyset_after
+from foodgram.settings import FEED_FANOUT_MAX_FOLLOWERS, FEED_MAX_ENTRIES
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+FANOUT_BATCH = 1000
+FEED_ORDERING = ('-pub_date', '-id')
+
+
+def is_fanned_out(author):
+    """Рецепты популярных авторов читаются при запросе ленты."""
+    return author.followers_count <= FEED_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out(recipe):
+    """
+    Запись нового рецепта в ленты подписчиков автора. Ленты сверх
+    FEED_MAX_ENTRIES обрезает фоновый trim_feeds --interval.
+    """
+    if not is_fanned_out(recipe.author):
+        return
+    followers = Follow.objects.filter(author=recipe.author_id).values_list(
+        'user_id', flat=True
+    ).iterator(chunk_size=FANOUT_BATCH)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=follower,
+                recipe=recipe,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date,
+            )
+            for follower in followers
+        ),
+        batch_size=FANOUT_BATCH,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """Последние рецепты автора в ленту нового подписчика."""
+    if not is_fanned_out(author):
+        return
+    recipes = Recipe.objects.filter(author=author).order_by(
+        *FEED_ORDERING
+    ).values_list('pk', 'pub_date')[:FEED_MAX_ENTRIES]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user=user, recipe_id=pk, author=author, pub_date=pub_date
+            )
+            for pk, pub_date in recipes
+        ),
+        batch_size=FANOUT_BATCH,
+        ignore_conflicts=True,
+    )
+    trim((user.pk,))
+
+
+def remove(user, author):
+    """Рецепты автора убираются из ленты отписавшегося."""
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def trim(user_ids, limit=FEED_MAX_ENTRIES):
+    """Удаление записей сверх limit самых новых в каждой ленте."""
+    ranked = FeedEntry.objects.filter(user__in=user_ids).order_by().annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('user'),
+            order_by=(F('pub_date').desc(), F('recipe').desc()),
+        )
+    ).values('id', 'row_number')
+    sql, params = ranked.query.sql_with_params()
+    return FeedEntry.objects.filter(id__in=RawSQL(
+        f'SELECT "id" FROM ({sql}) AS "ranked" WHERE "row_number" > %s',
+        (*params, limit)
+    )).delete()[0]
+
+
+def rebuild(user_ids, limit=FEED_MAX_ENTRIES):
+    """
+    Пересборка лент подписчиков целиком одним INSERT ... SELECT:
+    последние limit рецептов авторов, чьи рецепты раскладываются по
+    лентам. Для данных, загруженных в обход сигналов; счётчики
+    подписчиков должны быть уже пересчитаны.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    FeedEntry.objects.filter(user__in=user_ids).delete()
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    using = router.db_for_write(FeedEntry)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedEntry._meta.db_table} '
+            f'(user_id, recipe_id, author_id, pub_date) '
+            f'SELECT user_id, recipe_id, author_id, pub_date FROM ('
+            f'SELECT follow.user_id, recipe.id AS recipe_id, '
+            f'recipe.author_id, recipe.pub_date, ROW_NUMBER() OVER ('
+            f'PARTITION BY follow.user_id '
+            f'ORDER BY recipe.pub_date DESC, recipe.id DESC) AS row_number '
+            f'FROM {Follow._meta.db_table} AS follow '
+            f'JOIN {User._meta.db_table} AS author '
+            f'ON author.id = follow.author_id '
+            f'JOIN {Recipe._meta.db_table} AS recipe '
+            f'ON recipe.author_id = follow.author_id '
+            f'WHERE follow.user_id IN ({placeholders}) '
+            f'AND author.followers_count <= %s'
+            f') AS ranked WHERE row_number <= %s',
+            (*user_ids, FEED_FANOUT_MAX_FOLLOWERS, limit)
+        )
+
+
+def feed_page(user, position, size):
+    """
+    Рецепты ленты строго после position: записи ленты подписчика,
+    объединённые с рецептами популярных авторов, которые не
+    раскладываются по лентам. Оба источника читаются по индексам
+    (user, -pub_date, -recipe) и (author, -pub_date, -id).
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(author__in=Follow.objects.filter(
+        user=user, author__followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS
+    ).values('author'))
+    if position:
+        entries = entries.filter(
+            keyset_after(('-pub_date', '-recipe'), position)
+        )
+        pulled = pulled.filter(keyset_after(FEED_ORDERING, position))
+    keys = set(entries.order_by('-pub_date', '-recipe').values_list(
+        'pub_date', 'recipe'
+    )[:size])
+    keys.update(pulled.order_by(*FEED_ORDERING).values_list(
+        'pub_date', 'id'
+    )[:size])
+    return [pk for _, pk in sorted(keys, reverse=True)[:size]]
@@ -1,16 +1,67 @@
-from django.http import HttpResponse
-
-
-def convert_txt(shop_list):
-    """Создание файла для загрузки."""
-    lines = []
-    for ing in shop_list:
-        name = ing['ingredient__name']
-        measurement_unit = ing['ingredient__measurement_unit']
-        amount = ing['ingredient_total']
-        lines.append(f'{name} ({measurement_unit}) - {amount}')
-    content = '\n'.join(lines)
-    content_type = 'text/plain,charset=utf8'
-    response = HttpResponse(content, content_type=content_type)
-    response['Content-Disposition'] = 'attachment;'
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+SHOPPING_LIST_FILENAME = 'shopping_list'
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдо-файл: csv.writer пишет строку, а она сразу отдаётся."""
+
+    def write(self, value):
+        return value
+
+
+def rows(shop_list):
+    """Построчное чтение списка покупок через серверный курсор."""
+    for ing in shop_list.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE):
+        yield (
+            ing['ingredient__name'],
+            ing['ingredient__measurement_unit'],
+            ing['ingredient_total'],
+        )
+
+
+def render_txt(shop_list):
+    for name, measurement_unit, amount in rows(shop_list):
+        yield f'{name} ({measurement_unit}) - {amount}\n'
+
+
+def render_csv(shop_list):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows(shop_list):
+        yield writer.writerow(row)
+
+
+def render_json(shop_list):
+    separator = '['
+    for name, measurement_unit, amount in rows(shop_list):
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': measurement_unit,
+             'amount': amount},
+            ensure_ascii=False,
+        )
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json; charset=utf-8', render_json),
+}
+
+
+def convert_shopping_list(shop_list, file_format):
+    """Потоковая выгрузка списка покупок в выбранном формате."""
+    content_type, render = SHOPPING_LIST_FORMATS[file_format]
+    response = StreamingHttpResponse(
+        render(shop_list), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{SHOPPING_LIST_FILENAME}.{file_format}"'
+    )
     return response
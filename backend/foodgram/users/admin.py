@@ -6,13 +6,23 @@ from users.models import Follow, User
 
 
 class UserAdmin(UserAdmin):
-    list_display = ('first_name', 'last_name', 'username', 'email')
+    list_display = (
+        'first_name',
+        'last_name',
+        'username',
+        'email',
+        'recipes_count',
+        'followers_count',
+    )
     search_fields = ('username', 'email')
     empty_value_display = EMPTY_VALUE_DISPLAY
+    show_full_result_count = False
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('author', 'user',)
+    list_select_related = ('author', 'user')
+    autocomplete_fields = ('author', 'user')
     search_fields = (
         'author__username',
         'author__email',
@@ -20,6 +30,7 @@ class FollowAdmin(admin.ModelAdmin):
         'user__email',
     )
     empty_value_display = EMPTY_VALUE_DISPLAY
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,159 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram.settings import (
+    TOKEN_CACHE_SHARED,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TIMEOUT
+)
+from recipes.indexes import bump_version, get_version
+
+
+def shared_key(key):
+    """Ключ общего кэша: сам токен в кэш-сервер не попадает."""
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def version_key(key):
+    """Версия токена в общем кэше: меняется при сбросе в любом процессе."""
+    return shared_key(key) + ':version'
+
+
+class TokenCache:
+    """
+    Токены процесса: LRU не больше max_size записей, каждая живёт
+    timeout секунд и действительна, пока не сменилась версия токена в
+    общем кэше. Сброс увеличивает generation: чтение из БД, начатое
+    до сброса, не кладёт в кэш устаревшего пользователя.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = 0
+            self.shared_hits = 0
+            self.misses = 0
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if (entry is not None and entry[1] > time.monotonic()
+                    and entry[2] == version):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, generation, version):
+        with self.lock:
+            if generation != self.generation or not self.max_size:
+                return
+            self.entries[key] = (
+                value, time.monotonic() + self.timeout, version
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, keys=(), user_pk=None):
+        """Сброс токенов keys и всех токенов пользователя user_pk."""
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+            if user_pk is not None:
+                for key in [
+                    key for key, (value, *_) in self.entries.items()
+                    if value[0].pk == user_pk
+                ]:
+                    del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'timeout': self.timeout,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses - self.shared_hits,
+                'hit_rate': self.hits / total if total else None,
+            }
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TIMEOUT)
+
+
+def invalidate(keys=(), user_pk=None):
+    """
+    Сброс токенов в кэше процесса и новые версии токенов keys в общем
+    кэше: другие процессы увидят сброс при следующем запросе.
+    """
+    token_cache.delete(keys, user_pk)
+    if TOKEN_CACHE_SHARED and keys:
+        cache.delete_many([shared_key(key) for key in keys])
+    for key in keys:
+        bump_version(version_key(key))
+
+
+def get_stats():
+    """Попадания и промахи кэша токенов этого процесса."""
+    return token_cache.stats()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к authtoken_token на каждый запрос:
+    пара пользователь и токен берётся из LRU процесса, затем, если
+    TOKEN_CACHE_SHARED, из общего кэша, и только потом из БД.
+
+    Записи сбрасываются при удалении токена (выход через djoser) и
+    сохранении пользователя (смена пароля, деактивация), см.
+    users/signals.py. Другие процессы сверяют версию токена в общем
+    кэше на каждом запросе и видят сброс сразу.
+    """
+
+    def authenticate_credentials(self, key):
+        generation = token_cache.generation
+        # Версия читается до пользователя: сброс после этого момента
+        # сменит её, и запись не переживёт следующий запрос.
+        version = get_version(version_key(key))
+        cached = token_cache.get(key, version)
+        if cached is None and TOKEN_CACHE_SHARED:
+            # Запись общего кэша годится только со своей версией: её мог
+            # положить процесс, прочитавший БД до сброса.
+            shared = cache.get(shared_key(key))
+            if shared is not None and shared[1] == version:
+                cached = shared[0]
+                with token_cache.lock:
+                    token_cache.shared_hits += 1
+                token_cache.set(key, cached, generation, version)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached, generation, version)
+            if TOKEN_CACHE_SHARED:
+                cache.set(
+                    shared_key(key), (cached, version), TOKEN_CACHE_TIMEOUT
+                )
+        # Копии на запрос: представления меняют request.user, а кэшированный
+        # объект общий для потоков процесса.
+        user, token = map(copy.copy, cached)
+        token.user = user
+        return user, token
@@ -1,8 +1,11 @@
+from collections import Counter
+
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
-from django.db import models
-from django.db.models import UniqueConstraint
+from django.db import models, router, transaction
+from django.db.models import F, UniqueConstraint
 
+from foodgram.db.models import DenormalizedFieldsMixin
 from foodgram.settings import (
     FIRST_AND_LAST_NAME_MAX_LENGTH,
     EMAIL_MAX_LENGTH,
@@ -10,8 +13,9 @@ from foodgram.settings import (
 )
 
 
-class User(AbstractUser):
+class User(DenormalizedFieldsMixin, AbstractUser):
     """Модель пользователя."""
+    DENORMALIZED_FIELDS = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('first_name', 'last_name', 'username')
     username = models.CharField(
@@ -36,6 +40,16 @@ class User(AbstractUser):
         max_length=EMAIL_MAX_LENGTH,
         unique=True,
     )
+    recipes_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
 
     class Meta:
         ordering = ('username',)
@@ -46,6 +60,26 @@ class User(AbstractUser):
         return self.username
 
 
+class FollowQuerySet(models.QuerySet):
+    """
+    У подписок нет сигналов удаления, чтобы каскад от пользователя удалял
+    их одним DELETE без загрузки строк (счётчики авторов тогда правит
+    users.signals). Удаление через ORM правит счётчики здесь: по одному
+    UPDATE на каждое число удалённых подписчиков автора.
+    """
+
+    def delete(self):
+        with transaction.atomic(
+            using=router.db_for_write(self.model), savepoint=False
+        ):
+            removed = Counter(self.values_list('author_id', flat=True))
+            for count in set(removed.values()):
+                User.objects.filter(pk__in=[
+                    pk for pk, total in removed.items() if total == count
+                ]).update(followers_count=F('followers_count') - count)
+            return super().delete()
+
+
 class Follow(models.Model):
     """Модель подписки."""
     author = models.ForeignKey(
@@ -61,6 +95,8 @@ class Follow(models.Model):
         verbose_name='Подписчик',
     )
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         constraints = (
             UniqueConstraint(
@@ -72,3 +108,6 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user.username} подписан на {self.author.username}'
+
+    def delete(self, using=None, keep_parents=False):
+        return type(self).objects.filter(pk=self.pk).delete()
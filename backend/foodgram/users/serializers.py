@@ -1,10 +1,12 @@
 from django.core.validators import RegexValidator
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.serializers import CharField, EmailField, ModelSerializer
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 
 from djoser.serializers import UserCreateSerializer
 
+from api.fields import ImageVariantsField
 from foodgram.settings import LIMIT
 from recipes.models import Recipe
 from users.models import Follow, User
@@ -34,6 +36,8 @@ class UserSerializer(ModelSerializer):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(user=request.user, author=obj).exists()
 
 
@@ -84,6 +88,7 @@ class FollowSerializer(ModelSerializer):
             )
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создание записи подписки."""
         author = validated_data.get('author')
@@ -93,9 +98,11 @@ class FollowSerializer(ModelSerializer):
 
 class RecipesBriefSerializer(ModelSerializer):
     """Сериализатор для получения информации о рецепте."""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_variants')
         read_only_fields = fields
 
 
@@ -105,23 +112,21 @@ class ResponeSubscribeSerializer(UserSerializer):
         method_name='get_is_subscribed'
     )
     recipes = serializers.SerializerMethodField(method_name='get_recipes')
-    recipes_count = serializers.SerializerMethodField(
-        method_name='get_recipes_count'
-    )
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         model = User
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
     def get_recipes(self, obj):
-        """Получение списка рецептов автора."""
-        request = self.context.get('request')
-        recipes_limit = request.POST.get('recipes_limit', LIMIT)
-        queryset = obj.recipes.all()
-        if recipes_limit:
-            queryset = queryset[:(recipes_limit)]
+        """
+        Получение списка рецептов автора.
+        Вьюсет загружает их заранее для всей страницы в limited_recipes.
+        """
+        if hasattr(obj, 'limited_recipes'):
+            queryset = obj.limited_recipes
+        else:
+            request = self.context.get('request')
+            recipes_limit = request.query_params.get('recipes_limit', LIMIT)
+            queryset = obj.recipes.all()[:int(recipes_limit)]
         return RecipesBriefSerializer(queryset, many=True).data
-
-    def get_recipes_count(self, obj):
-        """Подсчет рецептов."""
-        return obj.recipes.all().count()
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.authentication import invalidate
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(instance, created, **kwargs):
+    """Новый подписчик автора."""
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1
+        )
+
+
+@receiver(pre_delete, sender=User)
+def follower_deleting(instance, **kwargs):
+    """
+    Подписки пользователя удаляются каскадом одним DELETE, до него
+    счётчики подписчиков его авторов уменьшаются одним UPDATE.
+    """
+    User.objects.filter(
+        pk__in=Follow.objects.filter(user=instance.pk).values('author_id')
+    ).update(followers_count=F('followers_count') - 1)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    """Выход через djoser или удаление пользователя: токен из кэша."""
+    transaction.on_commit(lambda: invalidate((instance.key,)))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(instance, created=False, update_fields=None, **kwargs):
+    """
+    Смена пароля, деактивация, правка профиля: пользователь из кэша.
+    У нового пользователя токенов нет, а вход меняет только last_login.
+    """
+    if created or update_fields == {'last_login'}:
+        return
+    keys = tuple(
+        Token.objects.filter(user_id=instance.pk)
+        .values_list('key', flat=True)
+    )
+    transaction.on_commit(lambda: invalidate(keys, instance.pk))
@@ -1,11 +1,24 @@
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Exists,
+    OuterRef,
+    Prefetch,
+    Value,
+    prefetch_related_objects
+)
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.validators import ValidationError
 
 from api.paginations import CustomPagination
+from foodgram.settings import LIMIT
+from recipes.models import Recipe
+from recipes.timelines import backfill, remove
 from users.models import Follow, User
 from users.serializers import (
     FollowSerializer,
@@ -16,6 +29,43 @@ from users.serializers import (
 class CustomUserViewSet(UserViewSet):
     """Вьюсет пользователей."""
     pagination_class = CustomPagination
+    keyset_ordering = ('username', 'id')
+
+    def get_queryset(self):
+        """Пользователи с признаком подписки, вычисленным в SQL."""
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_subscribed=Exists(
+                    Follow.objects.filter(user=user, author=OuterRef('pk'))
+                )
+            )
+        return queryset
+
+    def get_subscribed_authors(self, user):
+        """Авторы, на которых подписан user."""
+        return User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        )
+
+    def prefetch_recipes(self, authors):
+        """Первые recipes_limit рецептов всех авторов одним запросом."""
+        limit = self.request.query_params.get('recipes_limit', LIMIT)
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            limit = -1
+        if limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Должно быть целым неотрицательным числом.'}
+            )
+        prefetch_related_objects(authors, Prefetch(
+            'recipes',
+            queryset=Recipe.objects.first_per_author(authors, limit),
+            to_attr='limited_recipes',
+        ))
+        return authors
 
     @action(
         detail=True,
@@ -35,9 +85,12 @@ class CustomUserViewSet(UserViewSet):
 
         if request.method == 'POST':
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                backfill(user, author)
+            author = self.get_subscribed_authors(user).get(pk=author.pk)
             serializer = ResponeSubscribeSerializer(
-                author,
+                self.prefetch_recipes([author])[0],
                 context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -50,7 +103,9 @@ class CustomUserViewSet(UserViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        follow.delete()
+        with transaction.atomic():
+            follow.delete()
+            remove(user, author)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -63,10 +118,10 @@ class CustomUserViewSet(UserViewSet):
     def subscriptions(self, request):
         """Информация о подписке."""
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = self.get_subscribed_authors(user)
         pages = self.paginate_queryset(queryset)
         serializer = ResponeSubscribeSerializer(
-            pages,
+            self.prefetch_recipes(pages),
             many=True,
             context={'request': request}
         )